@@ -8,17 +8,38 @@ import os
 import logging
 import subprocess
 import sys
-from flow import create_coding_agent_flow
-
-# Set up logging for demo
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('coding_agent_demo.log'),
-        logging.StreamHandler()
-    ]
-)
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flow import coding_agent_flow
+
+# Working directory captured once at import; call refresh_cwd() after os.chdir()
+_CWD = os.getcwd()
+
+def refresh_cwd():
+    """Re-read the process working directory after an os.chdir()."""
+    global _CWD
+    _CWD = os.getcwd()
+    return _CWD
+
+def _configure_logging():
+    """
+    Set up root logging for the demo.
+    Shares coding_agent.log with main.py and is skipped if handlers are already attached;
+    the log file is only opened on the first record.
+    """
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('coding_agent.log', delay=True),
+            logging.StreamHandler()
+        ]
+    )
+
+# Inputs that end an interactive session (longest is 4 characters)
+_EXIT_COMMANDS = frozenset({"quit", "exit", "q"})
 
 def demo_cli_usage():
     """Demonstrate CLI usage of the coding agent."""
@@ -29,26 +50,30 @@ def demo_cli_usage():
     print("Demonstrating command-line usage of the coding agent")
     print()
     
-    # CLI demo examples
+    # CLI demo examples ("command" is for display, "argv" is executed without a shell)
     cli_examples = [
         {
             "name": "Directory Listing",
             "command": 'python main.py --query "Show me the structure of the current directory"',
+            "argv": [sys.executable, "main.py", "--query", "Show me the structure of the current directory"],
             "description": "List directory contents via CLI"
         },
         {
             "name": "File Reading",
             "command": 'python main.py --query "Read the contents of README.md"',
+            "argv": [sys.executable, "main.py", "--query", "Read the contents of README.md"],
             "description": "Read a file via CLI"
         },
         {
             "name": "Text Search",
             "command": 'python main.py --query "Search for \'pocketflow\' in Python files"',
+            "argv": [sys.executable, "main.py", "--query", "Search for 'pocketflow' in Python files"],
             "description": "Search for text patterns via CLI"
         },
         {
             "name": "Help Command",
             "command": 'python main.py --help',
+            "argv": [sys.executable, "main.py", "--help"],
             "description": "Show available CLI options"
         }
     ]
@@ -58,53 +83,96 @@ def demo_cli_usage():
         print(f"Description: {example['description']}")
         print(f"Command: {example['command']}")
         print("-" * 40)
-        
-        # Ask user if they want to run this command
-        try:
-            choice = input("Run this command? (y/n/s=skip all): ").strip().lower()
-            if choice == 's':
-                print("Skipping remaining CLI demos.")
-                break
-            elif choice == 'y':
-                print(f"Executing: {example['command']}")
-                print("=" * 40)
-                
-                # Run the command
+    print()
+    
+    # Ask once which examples to run
+    try:
+        answer = input("Select examples to run, e.g. 1,3 or 'all' or 'none': ")
+    except (EOFError, KeyboardInterrupt):
+        print("\nExiting CLI demo.")
+        return
+    
+    selected = _parse_example_selection(answer, len(cli_examples))
+    if not selected:
+        print("No examples selected.")
+        return
+    
+    try:
+        for i in selected:
+            example = cli_examples[i - 1]
+            print(f"Executing CLI Example {i}: {example['command']}")
+            print("=" * 40)
+            
+            # Run the command, streaming its output as it is produced
+            try:
+                proc = subprocess.Popen(
+                    example['argv'],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1
+                )
+
+                # Kill the child if it runs past 60 seconds, even while
+                # we are blocked reading its output
+                timed_out = threading.Event()
+
+                def _kill_on_timeout():
+                    timed_out.set()
+                    proc.kill()
+
+                timer = threading.Timer(60, _kill_on_timeout)
+                timer.start()
                 try:
-                    result = subprocess.run(
-                        example['command'],
-                        shell=True,
-                        capture_output=True,
-                        text=True,
-                        timeout=60
-                    )
-                    
-                    print("STDOUT:")
-                    print(result.stdout)
-                    if result.stderr:
-                        print("STDERR:")
-                        print(result.stderr)
-                    print(f"Return code: {result.returncode}")
-                    
-                except subprocess.TimeoutExpired:
+                    for line in proc.stdout:
+                        print(line, end='')
+                    proc.wait()
+                finally:
+                    timer.cancel()
+                    proc.stdout.close()
+
+                if timed_out.is_set():
                     print("Command timed out after 60 seconds")
-                except Exception as e:
-                    print(f"Error running command: {e}")
-            else:
-                print("Skipped.")
-                
-        except (EOFError, KeyboardInterrupt):
-            print("\nExiting CLI demo.")
-            break
-        
-        print("=" * 60)
-        print()
+                else:
+                    print(f"Return code: {proc.returncode}")
+
+            except Exception as e:
+                print(f"Error running command: {e}")
+            
+            print("=" * 60)
+            print()
+    except KeyboardInterrupt:
+        print("\nExiting CLI demo.")
 
-def demo_coding_agent():
-    """Run a series of demo tasks to showcase the coding agent."""
+def _parse_example_selection(answer, count):
+    """
+    Parse a selection like "1,3", "all" or "none" into sorted 1-indexed example numbers.
+    Unknown or out-of-range entries are ignored.
+    """
+    answer = answer.strip().lower()
+    if answer in ("", "none", "n"):
+        return []
+    if answer in ("all", "a", "y"):
+        return list(range(1, count + 1))
+    
+    selected = set()
+    for part in answer.replace(" ", ",").split(","):
+        if part.isdigit() and 1 <= int(part) <= count:
+            selected.add(int(part))
+        elif part:
+            print(f"Ignoring invalid selection: {part}")
+    return sorted(selected)
+
+def demo_coding_agent(parallel=False):
+    """
+    Run a series of demo tasks to showcase the coding agent.
+    
+    Args:
+        parallel (bool): Run the independent demo tasks concurrently in a
+            process pool and print results as they complete.
+    """
     
-    working_dir = os.getcwd()
-    coding_agent_flow = create_coding_agent_flow()
+    working_dir = _CWD
     
     # Demo examples
     demo_tasks = [
@@ -135,34 +203,16 @@ def demo_coding_agent():
     print("=" * 60)
     print()
     
+    if parallel:
+        _run_demo_tasks_parallel(demo_tasks, working_dir)
+        return
+    
     for i, task in enumerate(demo_tasks, 1):
-        print(f"Demo {i}: {task['name']}")
-        print(f"Description: {task['description']}")
-        print(f"Query: {task['query']}")
-        print("-" * 40)
-        
-        # Initialize shared memory for this task
-        shared = {
-            "user_query": task["query"],
-            "working_dir": working_dir,
-            "history": [],
-            "edit_operations": [],
-            "response": ""
-        }
+        _print_demo_header(i, task)
         
         try:
-            # Run the coding agent
-            coding_agent_flow.run(shared)
-            
-            # Display results
-            print("AGENT RESPONSE:")
-            print(shared.get("response", "No response generated"))
-            print()
-            print(f"Actions performed: {len(shared['history'])}")
-            for j, action in enumerate(shared['history'], 1):
-                status = "✓" if action.get('result', {}).get('success', True) else "✗"
-                print(f"  {j}. {status} {action['tool']}: {action['reason']}")
-            
+            shared = _run_demo_task(task, working_dir)
+            _print_demo_result(shared)
         except Exception as e:
             print(f"Error in demo task: {str(e)}")
         
@@ -177,11 +227,60 @@ def demo_coding_agent():
             break
         print()
 
+def _run_demo_tasks_parallel(demo_tasks, working_dir):
+    """Run demo tasks in a process pool, printing each result as it arrives."""
+    print(f"Running {len(demo_tasks)} demos in parallel...")
+    print()
+    
+    with ProcessPoolExecutor(max_workers=min(4, len(demo_tasks))) as executor:
+        futures = {
+            executor.submit(_run_demo_task, task, working_dir): (i, task)
+            for i, task in enumerate(demo_tasks, 1)
+        }
+        
+        for future in as_completed(futures):
+            i, task = futures[future]
+            _print_demo_header(i, task)
+            
+            try:
+                _print_demo_result(future.result())
+            except Exception as e:
+                print(f"Error in demo task: {str(e)}")
+            
+            print("=" * 60)
+            print()
+
+def _run_demo_task(task, working_dir):
+    """Run a single demo task and return its shared memory (top-level so it can be pickled)."""
+    shared = {
+        "user_query": task["query"],
+        "working_dir": working_dir,
+        "history": [],
+        "edit_operations": [],
+        "response": ""
+    }
+    coding_agent_flow.run(shared)
+    return shared
+
+def _print_demo_header(i, task):
+    print(f"Demo {i}: {task['name']}")
+    print(f"Description: {task['description']}")
+    print(f"Query: {task['query']}")
+    print("-" * 40)
+
+def _print_demo_result(shared):
+    print("AGENT RESPONSE:")
+    print(shared.get("response", "No response generated"))
+    print()
+    print(f"Actions performed: {len(shared['history'])}")
+    for j, action in enumerate(shared['history'], 1):
+        status = "✓" if action.get('result', {}).get('success', True) else "✗"
+        print(f"  {j}. {status} {action['tool']}: {action['reason']}")
+
 def interactive_mode():
     """Run the coding agent in interactive mode."""
     
-    working_dir = os.getcwd()
-    coding_agent_flow = create_coding_agent_flow()
+    working_dir = _CWD
     
     print("=" * 60)
     print("CODING AGENT - INTERACTIVE MODE")
@@ -196,7 +295,7 @@ def interactive_mode():
             print("\nGoodbye!")
             break
         
-        if user_query.lower() in ['quit', 'exit', 'q']:
+        if len(user_query) <= 4 and user_query.lower() in _EXIT_COMMANDS:
             print("Goodbye!")
             break
         
@@ -232,6 +331,11 @@ def interactive_mode():
         print()
 
 if __name__ == "__main__":
+    _configure_logging()
+    
+    # --parallel runs the predefined demos concurrently
+    parallel = "--parallel" in sys.argv[1:]
+    
     print("Choose demo mode:")
     print("1. Predefined demos (programmatic)")
     print("2. Interactive mode")
@@ -245,7 +349,7 @@ if __name__ == "__main__":
         sys.exit(0)
     
     if choice == "1":
-        demo_coding_agent()
+        demo_coding_agent(parallel=parallel)
     elif choice == "2":
         interactive_mode()
     elif choice == "3":
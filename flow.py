@@ -67,4 +67,7 @@ def create_qa_flow():
     
     return Flow(start=get_question_node)
 
-coding_agent_flow = create_coding_agent_flow()
\ No newline at end of file
+# Module-level flow shared by main.py and demo.py. Flow._orch copies each node
+# before running it and all per-run state lives in the `shared` dict, so the
+# same flow object can be reused across queries.
+coding_agent_flow = create_coding_agent_flow()
@@ -1,17 +1,37 @@
 import os
 import logging
 import argparse
-from flow import create_coding_agent_flow
+from flow import coding_agent_flow
+from utils.providers import DEFAULT_MODEL
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('coding_agent.log'),
-        logging.StreamHandler()
-    ]
-)
+# Working directory captured once at import; call refresh_cwd() after os.chdir()
+_CWD = os.getcwd()
+
+def refresh_cwd():
+    """Re-read the process working directory after an os.chdir()."""
+    global _CWD
+    _CWD = os.getcwd()
+    return _CWD
+
+def _configure_logging():
+    """
+    Set up root logging for CLI runs.
+    Skipped if handlers are already attached (e.g. by demo.py in the same process);
+    the log file is only opened on the first record.
+    """
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('coding_agent.log', delay=True),
+            logging.StreamHandler()
+        ]
+    )
+
+# Inputs that end an interactive session (longest is 4 characters)
+_EXIT_COMMANDS = frozenset({"quit", "exit", "q"})
 
 def run_coding_agent(user_query, working_dir=None, model=None):
     """
@@ -20,19 +40,19 @@ def run_coding_agent(user_query, working_dir=None, model=None):
     Args:
         user_query (str): The user's coding request
         working_dir (str, optional): Working directory. Defaults to current directory.
-        model (str, optional): LLM model to use. Defaults to claude-sonnet-4-20250514.
+        model (str, optional): LLM model to use. Defaults to DEFAULT_MODEL (POCKETFLOW_LLM_MODEL or claude-sonnet-4-20250514).
     
     Returns:
         dict: The shared memory state after execution
     """
     if working_dir is None:
-        working_dir = os.getcwd()
+        working_dir = _CWD
     
     # Initialize shared memory according to design doc
     shared = {
         "user_query": user_query,
         "working_dir": working_dir,
-        "model": model if model else "claude-sonnet-4-20250514",
+        "model": model if model else DEFAULT_MODEL,
         "history": [],
         "edit_operations": [],
         "response": ""
@@ -41,9 +61,7 @@ def run_coding_agent(user_query, working_dir=None, model=None):
     logging.info(f"Starting coding agent with query: {user_query}")
     logging.info(f"Working directory: {working_dir}")
     
-    # Create and run the coding agent flow
-    coding_agent_flow = create_coding_agent_flow()
-    
+    # Run the shared coding agent flow (all per-run state lives in `shared`)
     try:
         coding_agent_flow.run(shared)
         
@@ -61,14 +79,14 @@ def run_coding_agent(user_query, working_dir=None, model=None):
 
 def interactive_mode(model=None):
     """Run the coding agent in interactive mode."""
-    working_dir = os.getcwd()
+    working_dir = _CWD
     
     print("=" * 60)
     print("CODING AGENT - INTERACTIVE MODE")
     print("=" * 60)
     print("Enter your coding requests. Type 'quit' to exit.")
     print(f"Working directory: {working_dir}")
-    print(f"LLM model: {model if model else 'claude-sonnet-4-20250514'}")
+    print(f"LLM model: {model if model else DEFAULT_MODEL}")
     print()
     
     while True:
@@ -78,7 +96,7 @@ def interactive_mode(model=None):
             print("\nGoodbye!")
             break
         
-        if user_query.lower() in ['quit', 'exit', 'q']:
+        if len(user_query) <= 4 and user_query.lower() in _EXIT_COMMANDS:
             print("Goodbye!")
             break
         
@@ -146,13 +164,13 @@ def main():
         logging.getLogger().setLevel(logging.DEBUG)
     
     # Determine working directory
-    working_dir = args.working_dir if args.working_dir else os.getcwd()
+    working_dir = args.working_dir if args.working_dir else _CWD
     
     if args.query:
         # CLI mode with provided query
         print(f"Executing query: {args.query}")
         print(f"Working directory: {working_dir}")
-        print(f"LLM model: {args.model if args.model else 'claude-sonnet-4-20250514'}")
+        print(f"LLM model: {args.model if args.model else DEFAULT_MODEL}")
         print("-" * 50)
         
         shared = run_coding_agent(args.query, working_dir, args.model)
@@ -188,4 +206,5 @@ def main():
         interactive_mode(args.model)
 
 if __name__ == "__main__":
+    _configure_logging()
     main()
@@ -1,18 +1,207 @@
+import io
 import os
+import re
+import json
+import string
+import hashlib
 import yaml
 import logging
+import functools
+import operator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pocketflow import Node, BatchNode
+from pocketflow import Node
 from utils.call_llm import call_llm
+from utils.providers import DEFAULT_MODEL
 from utils.read_file import read_file
 from utils.delete_file import delete_file
-from utils.replace_file import replace_file
+from utils.replace_file import replace_file_batch
 from utils.search_ops import grep_search
 from utils.dir_ops import list_dir
+from utils.compress_history import compress, SUMMARY_TOOL
+from utils.compact import compact_tool_result
 
 # Configure logger for nodes
 logger = logging.getLogger(__name__)
 
+# libyaml C loader when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _preview(obj, n=100):
+    """Return at most n characters of str(obj), adding "..." when it was cut."""
+    s = str(obj)[:n + 1]
+    return s if len(s) <= n else s[:n] + "..."
+
+
+def _result_summary(result, n=100):
+    """
+    Preview an action result without stringifying all of it: nested lists and
+    dicts are shown by size and strings are cut before they are joined.
+    """
+    if not isinstance(result, dict):
+        return _preview(result, n)
+    fields = []
+    for key, value in result.items():
+        if isinstance(value, (list, tuple, dict)):
+            value = f"<{len(value)} items>"
+        elif isinstance(value, str):
+            value = _preview(value, n)
+        fields.append(f"{key}: {value}")
+    return _preview(", ".join(fields), n)
+
+
+# Keys every planned edit must have
+_REQUIRED_EDIT_KEYS = frozenset(("start_line", "end_line", "replacement"))
+
+# Files at least this large get a line window in the edit-planning prompt
+_EDIT_WINDOW_MIN_BYTES = 8 * 1024
+# Lines of context kept around the hinted line range
+_EDIT_WINDOW_CONTEXT = 30
+# Matches line hints such as "line 12", "lines 10-20" or "lines 10 to 20"
+_LINE_HINT_RE = re.compile(r"\blines?\s+(\d+)(?:\s*(?:-|–|to)\s*(\d+))?", re.IGNORECASE)
+
+
+def _line_range_hint(*texts):
+    """Return the (start, end) span covering all line hints in the texts, or None."""
+    numbers = []
+    for text in texts:
+        for match in _LINE_HINT_RE.finditer(str(text or "")):
+            numbers.append(int(match.group(1)))
+            if match.group(2):
+                numbers.append(int(match.group(2)))
+    if not numbers:
+        return None
+    return min(numbers), max(numbers)
+
+
+def _numbered_window(lines, start, end):
+    """Render lines[start-1:end] (1-indexed) prefixed with their line numbers."""
+    buf = io.StringIO()
+    buf.writelines(f"{i:5d}| {line}" for i, line in enumerate(lines[start - 1:end], start))
+    return buf.getvalue()
+
+
+def _store_blob(shared, content):
+    """
+    Store content once in shared["blob_store"] under its sha1 and return the key.
+    Repeated reads of the same content share a single copy.
+    """
+    ref = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    shared.setdefault("blob_store", {}).setdefault(ref, content)
+    return ref
+
+
+def _content_ref_result(shared, result):
+    """Replace a successful read result's content with a blob_store reference."""
+    if not result.get("success"):
+        return result
+    ref_result = {key: value for key, value in result.items() if key != "content"}
+    ref_result["content_ref"] = _store_blob(shared, result["content"])
+    ref_result["length"] = len(result["content"])
+    return ref_result
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_response_block(response):
+    """
+    Extract and parse the fenced ```json block from an LLM response.
+    Falls back to a ```yaml block for models that ignore the requested format.
+    
+    Memoized on the raw response text, so repeated responses (e.g. canned
+    finish selections) are parsed once. The returned object is shared
+    between calls and must not be mutated.
+    """
+    if "```json" in response:
+        return json.loads(response.split("```json")[1].split("```")[0])
+    yaml_str = response.split("```yaml")[1].split("```")[0].strip()
+    return yaml.load(yaml_str, Loader=_YAML_LOADER)
+
+
+# Prompt templates, parsed once at import; only the $fields are filled in per call
+_DECISION_PROMPT = string.Template("""You are a coding assistant with access to file operations. Analyze the user's request and decide which tool to use.
+
+USER REQUEST: $user_query
+WORKING DIRECTORY: $working_dir
+$history_context
+
+AVAILABLE TOOLS:
+1. read_file - Read contents of a specific file, or of several files at once
+   Parameters: target_file (path) or targets (list of paths to read together), explanation (reason)
+   
+2. edit_file - Modify a file with specific changes  
+   Parameters: target_file (path), instructions (what to change), code_edit (the actual changes)
+   
+3. delete_file - Remove a file
+   Parameters: target_file (path), explanation (reason)
+   
+4. grep_search - Search for text patterns in files
+   Parameters: query (search term), case_sensitive (optional), include_pattern (optional), exclude_pattern (optional), explanation (reason)
+   
+5. list_dir - Show directory contents with tree visualization
+   Parameters: relative_workspace_path (directory path), explanation (reason)
+   
+6. finish - Complete the task and provide final response
+
+Decide which tool to use next. Output in JSON format, including only the params that apply to the chosen tool:
+
+```json
+{
+  "tool": "<tool_name>",
+  "reason": "<brief explanation why this tool is needed>",
+  "params": {
+    "target_file": "<file_path>",
+    "targets": ["<file_path>", "<file_path> (read_file only, to read several files at once)"],
+    "explanation": "<explanation>",
+    "instructions": "<edit_instructions (edit_file only)>",
+    "code_edit": "<code_changes (edit_file only)>",
+    "query": "<search_term (grep_search only)>",
+    "relative_workspace_path": "<dir_path (list_dir only)>"
+  }
+}
+```""")
+
+_ANALYZE_PROMPT = string.Template("""You need to analyze the edit instructions and create a specific edit plan.
+
+CURRENT FILE CONTENT$content_note:
+```
+$file_content
+```
+
+EDIT INSTRUCTIONS: $instructions
+
+CODE EDIT TEMPLATE:
+```
+$code_edit
+```
+
+Create a plan to apply these edits. Return a list of specific edit operations in JSON format.
+Each edit should specify the exact line numbers and replacement content.
+
+IMPORTANT:
+- Line numbers are 1-indexed
+- If inserting new content, use the same start_line and end_line
+- If deleting lines, set replacement to empty string
+- For replacements, specify the exact range to replace
+
+Output format:
+```json
+{
+  "edits": [
+    {
+      "start_line": 1,
+      "end_line": 3,
+      "replacement": "new content here\\ncan be multiple lines\\n"
+    },
+    {
+      "start_line": 10,
+      "end_line": 10,
+      "replacement": "single line replacement"
+    }
+  ]
+}
+```""")
+
 
 class MainDecisionAgentNode(Node):
     """Main agent that decides which tool to use based on user query and context."""
@@ -21,21 +210,25 @@ class MainDecisionAgentNode(Node):
         user_query = shared["user_query"]
         history = shared.get("history", [])
         working_dir = shared["working_dir"]
-        model = shared.get("model", "claude-sonnet-4-20250514")
+        model = shared.get("model", DEFAULT_MODEL)
+        
+        logger.info("MainDecisionAgent: Processing user query: '%s'", user_query)
+        logger.info("MainDecisionAgent: Working directory: %s", working_dir)
+        logger.info("MainDecisionAgent: History contains %s previous actions", len(history))
         
-        logger.info(f"MainDecisionAgent: Processing user query: '{user_query}'")
-        logger.info(f"MainDecisionAgent: Working directory: {working_dir}")
-        logger.info(f"MainDecisionAgent: History contains {len(history)} previous actions")
+        # Replace older turns with a summary once the history grows long
+        compressed = compress(history, model=model, cache=shared.setdefault("history_summary_cache", {}))
         
         # Format history for context
         history_context = ""
         if history:
             history_context = "\nPrevious actions:\n"
-            for i, action in enumerate(history[-3:]):  # Show last 3 actions
+            if compressed[0]["tool"] == SUMMARY_TOOL:
+                history_context += f"Earlier actions (summary): {compressed[0]['result']}\n"
+            for i, action in enumerate(compressed[-3:]):  # Show last 3 actions
                 history_context += f"{i+1}. {action['tool']}: {action['reason']}\n"
                 if action.get('result'):
-                    result_preview = str(action['result'])[:100] + "..." if len(str(action['result'])) > 100 else str(action['result'])
-                    history_context += f"   Result: {result_preview}\n"
+                    history_context += f"   Result: {_result_summary(action['result'])}\n"
         
         return {
             "user_query": user_query,
@@ -48,63 +241,32 @@ class MainDecisionAgentNode(Node):
     def exec(self, prep_res):
         logger.info("MainDecisionAgent: Calling LLM to decide next action")
         
-        prompt = f"""You are a coding assistant with access to file operations. Analyze the user's request and decide which tool to use.
-
-USER REQUEST: {prep_res['user_query']}
-WORKING DIRECTORY: {prep_res['working_dir']}
-{prep_res['history_context']}
-
-AVAILABLE TOOLS:
-1. read_file - Read contents of a specific file
-   Parameters: target_file (path), explanation (reason)
-   
-2. edit_file - Modify a file with specific changes  
-   Parameters: target_file (path), instructions (what to change), code_edit (the actual changes)
-   
-3. delete_file - Remove a file
-   Parameters: target_file (path), explanation (reason)
-   
-4. grep_search - Search for text patterns in files
-   Parameters: query (search term), case_sensitive (optional), include_pattern (optional), exclude_pattern (optional), explanation (reason)
-   
-5. list_dir - Show directory contents with tree visualization
-   Parameters: relative_workspace_path (directory path), explanation (reason)
-   
-6. finish - Complete the task and provide final response
-
-Decide which tool to use next. Output in YAML format:
-
-```yaml
-tool: <tool_name>
-reason: <brief explanation why this tool is needed>
-params:
-  target_file: <file_path>  # if applicable
-  explanation: <explanation>  # if applicable
-  instructions: <edit_instructions>  # for edit_file only
-  code_edit: <code_changes>  # for edit_file only
-  query: <search_term>  # for grep_search only
-  relative_workspace_path: <dir_path>  # for list_dir only
-```"""
+        prompt = _DECISION_PROMPT.substitute(
+            user_query=prep_res['user_query'],
+            working_dir=prep_res['working_dir'],
+            history_context=prep_res['history_context']
+        )
 
         response = call_llm(prompt, prep_res['model'])
         
-        # Parse YAML response
+        # Parse JSON response
         try:
-            yaml_str = response.split("```yaml")[1].split("```")[0].strip()
-            result = yaml.safe_load(yaml_str)
-            logger.info(f"MainDecisionAgent: Successfully parsed LLM response")
+            result = _parse_response_block(response)
+            if not isinstance(result, dict):
+                raise ValueError("response block is not an object")
+            logger.info("MainDecisionAgent: Successfully parsed LLM response")
         except Exception as e:
-            logger.warning(f"MainDecisionAgent: Failed to parse LLM response: {e}")
+            logger.warning("MainDecisionAgent: Failed to parse LLM response: %s", e)
             # Fallback parsing
             result = {"tool": "finish", "reason": "Unable to parse tool selection", "params": {}}
         
         # Validate result
         valid_tools = ["read_file", "edit_file", "delete_file", "grep_search", "list_dir", "finish"]
         if result.get("tool") not in valid_tools:
-            logger.warning(f"MainDecisionAgent: Invalid tool '{result.get('tool')}' selected, defaulting to finish")
+            logger.warning("MainDecisionAgent: Invalid tool '%s' selected, defaulting to finish", result.get('tool'))
             result = {"tool": "finish", "reason": "Invalid tool selected", "params": {}}
         
-        logger.info(f"MainDecisionAgent: Selected tool '{result['tool']}' with reason: {result['reason']}")
+        logger.info("MainDecisionAgent: Selected tool '%s' with reason: %s", result['tool'], result['reason'])
         return result
     
     def post(self, shared, prep_res, exec_res):
@@ -121,35 +283,54 @@ params:
             shared["history"] = []
         shared["history"].append(action_entry)
         
-        logger.info(f"MainDecisionAgent: Added action to history, transitioning to '{exec_res['tool']}'")
+        logger.info("MainDecisionAgent: Added action to history, transitioning to '%s'", exec_res['tool'])
         return exec_res["tool"]
 
 
 class ReadFileActionNode(Node):
-    """Reads a file and stores content in history."""
+    """Reads one file, or several concurrently, and stores the content in history."""
     
     def prep(self, shared):
         last_action = shared["history"][-1]
         target_file = last_action["params"].get("target_file", "")
+        targets = last_action["params"].get("targets")
         working_dir = shared["working_dir"]
         
-        logger.info(f"ReadFileAction: Preparing to read file '{target_file}' in directory '{working_dir}'")
-        return {"target_file": target_file, "working_dir": working_dir}
+        if isinstance(targets, list) and targets:
+            logger.info("ReadFileAction: Preparing to read %s files in directory '%s'", len(targets), working_dir)
+        else:
+            targets = None
+            logger.info("ReadFileAction: Preparing to read file '%s' in directory '%s'", target_file, working_dir)
+        return {"target_file": target_file, "targets": targets, "working_dir": working_dir}
     
     def exec(self, prep_res):
-        logger.info(f"ReadFileAction: Reading file '{prep_res['target_file']}'")
-        success, content = read_file(prep_res["target_file"], prep_res["working_dir"])
+        if prep_res["targets"]:
+            # Independent reads: overlap their I/O in a thread pool
+            logger.info("ReadFileAction: Reading %s files concurrently", len(prep_res['targets']))
+            with ThreadPoolExecutor(max_workers=min(8, len(prep_res["targets"]))) as executor:
+                files = list(executor.map(lambda path: self._read_one(path, prep_res["working_dir"]), prep_res["targets"]))
+            return {"success": all(f["success"] for f in files), "files": files}
+        
+        return self._read_one(prep_res["target_file"], prep_res["working_dir"])
+    
+    def _read_one(self, target_file, working_dir):
+        logger.info("ReadFileAction: Reading file '%s'", target_file)
+        success, content = read_file(target_file, working_dir)
         
         if success:
-            logger.info(f"ReadFileAction: Successfully read file '{prep_res['target_file']}' ({len(content)} characters)")
+            logger.info("ReadFileAction: Successfully read file '%s' (%s characters)", target_file, len(content))
         else:
-            logger.error(f"ReadFileAction: Failed to read file '{prep_res['target_file']}': {content}")
+            logger.error("ReadFileAction: Failed to read file '%s': %s", target_file, content)
         
-        return {"success": success, "content": content, "file_path": prep_res["target_file"]}
+        return {"success": success, "content": content, "file_path": target_file}
     
     def post(self, shared, prep_res, exec_res):
-        # Update last history entry with result
-        shared["history"][-1]["result"] = exec_res
+        # Update last history entry with the results, storing the content itself once in the blob store
+        if "files" in exec_res:
+            files = [_content_ref_result(shared, f) for f in exec_res["files"]]
+            shared["history"][-1]["result"] = {"success": exec_res["success"], "files": files}
+        else:
+            shared["history"][-1]["result"] = _content_ref_result(shared, exec_res)
         logger.info("ReadFileAction: Updated history with result, returning to main agent")
         return "decide_next"
 
@@ -170,27 +351,27 @@ class GrepSearchActionNode(Node):
             "working_dir": working_dir
         }
         
-        logger.info(f"GrepSearchAction: Preparing search for '{search_params['query']}' in '{working_dir}'")
+        logger.info("GrepSearchAction: Preparing search for '%s' in '%s'", search_params['query'], working_dir)
         if search_params["include_pattern"]:
-            logger.info(f"GrepSearchAction: Include pattern: {search_params['include_pattern']}")
+            logger.info("GrepSearchAction: Include pattern: %s", search_params['include_pattern'])
         if search_params["exclude_pattern"]:
-            logger.info(f"GrepSearchAction: Exclude pattern: {search_params['exclude_pattern']}")
+            logger.info("GrepSearchAction: Exclude pattern: %s", search_params['exclude_pattern'])
         
         return search_params
     
     def exec(self, search_params):
-        logger.info(f"GrepSearchAction: Executing search for '{search_params['query']}'")
+        logger.info("GrepSearchAction: Executing search for '%s'", search_params['query'])
         success, matches = grep_search(**search_params)
         
         if success:
-            logger.info(f"GrepSearchAction: Search completed successfully, found {len(matches)} matches")
+            logger.info("GrepSearchAction: Search completed successfully, found %s matches", len(matches))
         else:
-            logger.error(f"GrepSearchAction: Search failed: {matches}")
+            logger.error("GrepSearchAction: Search failed: %s", matches)
         
         return {"success": success, "matches": matches, "query": search_params["query"]}
     
     def post(self, shared, prep_res, exec_res):
-        shared["history"][-1]["result"] = exec_res
+        shared["history"][-1]["result"] = compact_tool_result("grep_search", exec_res, shared.setdefault("full_results", {}))
         logger.info("GrepSearchAction: Updated history with search results, returning to main agent")
         return "decide_next"
 
@@ -203,17 +384,17 @@ class ListDirectoryActionNode(Node):
         dir_path = last_action["params"].get("relative_workspace_path", ".")
         working_dir = shared["working_dir"]
         
-        logger.info(f"ListDirectoryAction: Preparing to list directory '{dir_path}' in '{working_dir}'")
+        logger.info("ListDirectoryAction: Preparing to list directory '%s' in '%s'", dir_path, working_dir)
         return {"dir_path": dir_path, "working_dir": working_dir}
     
     def exec(self, prep_res):
-        logger.info(f"ListDirectoryAction: Listing directory '{prep_res['dir_path']}'")
+        logger.info("ListDirectoryAction: Listing directory '%s'", prep_res['dir_path'])
         success, tree_str = list_dir(prep_res["dir_path"], prep_res["working_dir"])
         
         if success:
-            logger.info(f"ListDirectoryAction: Successfully listed directory")
+            logger.info("ListDirectoryAction: Successfully listed directory")
         else:
-            logger.error(f"ListDirectoryAction: Failed to list directory: {tree_str}")
+            logger.error("ListDirectoryAction: Failed to list directory: %s", tree_str)
         
         return {"success": success, "tree_visualization": tree_str}
     
@@ -231,17 +412,17 @@ class DeleteFileActionNode(Node):
         target_file = last_action["params"].get("target_file", "")
         working_dir = shared["working_dir"]
         
-        logger.info(f"DeleteFileAction: Preparing to delete file '{target_file}' in directory '{working_dir}'")
+        logger.info("DeleteFileAction: Preparing to delete file '%s' in directory '%s'", target_file, working_dir)
         return {"target_file": target_file, "working_dir": working_dir}
     
     def exec(self, prep_res):
-        logger.info(f"DeleteFileAction: Deleting file '{prep_res['target_file']}'")
+        logger.info("DeleteFileAction: Deleting file '%s'", prep_res['target_file'])
         success, message = delete_file(prep_res["target_file"], prep_res["working_dir"])
         
         if success:
-            logger.info(f"DeleteFileAction: Successfully deleted file '{prep_res['target_file']}'")
+            logger.info("DeleteFileAction: Successfully deleted file '%s'", prep_res['target_file'])
         else:
-            logger.error(f"DeleteFileAction: Failed to delete file '{prep_res['target_file']}': {message}")
+            logger.error("DeleteFileAction: Failed to delete file '%s': %s", prep_res['target_file'], message)
         
         return {"success": success, "message": message, "file_path": prep_res["target_file"]}
     
@@ -259,26 +440,26 @@ class ReadTargetFileNode(Node):
         target_file = last_action["params"].get("target_file", "")
         working_dir = shared["working_dir"]
         
-        logger.info(f"EditAgent-ReadTarget: Starting edit process for file '{target_file}'")
+        logger.info("EditAgent-ReadTarget: Starting edit process for file '%s'", target_file)
         return {"target_file": target_file, "working_dir": working_dir}
     
     def exec(self, prep_res):
-        logger.info(f"EditAgent-ReadTarget: Reading target file '{prep_res['target_file']}'")
+        logger.info("EditAgent-ReadTarget: Reading target file '%s'", prep_res['target_file'])
         success, content = read_file(prep_res["target_file"], prep_res["working_dir"])
         
         if success:
-            logger.info(f"EditAgent-ReadTarget: Successfully read target file ({len(content)} characters)")
+            logger.info("EditAgent-ReadTarget: Successfully read target file (%s characters)", len(content))
         else:
-            logger.error(f"EditAgent-ReadTarget: Failed to read target file: {content}")
+            logger.error("EditAgent-ReadTarget: Failed to read target file: %s", content)
         
         return {"success": success, "content": content, "file_path": prep_res["target_file"]}
     
     def post(self, shared, prep_res, exec_res):
-        # Store file content for edit planning
-        shared["history"][-1]["file_content"] = exec_res["content"]
+        # Store file content (by blob store reference) for edit planning
         shared["history"][-1]["file_success"] = exec_res["success"]
         
         if exec_res["success"]:
+            shared["history"][-1]["file_content_ref"] = _store_blob(shared, exec_res["content"])
             logger.info("EditAgent-ReadTarget: File read successful, proceeding to analyze and plan")
             return "analyze_plan"
         else:
@@ -293,16 +474,31 @@ class AnalyzeAndPlanChangesNode(Node):
     
     def prep(self, shared):
         last_action = shared["history"][-1]
-        file_content = last_action.get("file_content", "")
+        file_content = shared.get("blob_store", {}).get(last_action.get("file_content_ref"), "")
         instructions = last_action["params"].get("instructions", "")
         code_edit = last_action["params"].get("code_edit", "")
-        model = shared.get("model", "claude-sonnet-4-20250514")
-        
-        logger.info(f"EditAgent-Analyze: Planning edits based on instructions: '{instructions[:100]}...'")
-        logger.info(f"EditAgent-Analyze: File content length: {len(file_content)} characters")
+        model = shared.get("model", DEFAULT_MODEL)
+        
+        logger.info("EditAgent-Analyze: Planning edits based on instructions: '%.100s...'", instructions)
+        logger.info("EditAgent-Analyze: File content length: %s characters", len(file_content))
+        
+        # For large files, send only a numbered window around the hinted lines
+        content_note = ""
+        hint = _line_range_hint(instructions, code_edit) if len(file_content) >= _EDIT_WINDOW_MIN_BYTES else None
+        if hint:
+            # Split on "\n" only (unlike str.splitlines), matching replace_file_batch's line numbers
+            lines = io.StringIO(file_content, newline="\n").readlines()
+            start = max(1, hint[0] - _EDIT_WINDOW_CONTEXT)
+            end = min(len(lines), hint[1] + _EDIT_WINDOW_CONTEXT)
+            if start <= end:
+                file_content = _numbered_window(lines, start, end)
+                content_note = (f" (lines {start}-{end} of {len(lines)}, each prefixed with its line number; "
+                                f"other lines are elided. Use these line numbers in the edits.)")
+                logger.info("EditAgent-Analyze: Sending lines %s-%s of %s to the LLM", start, end, len(lines))
         
         return {
             "file_content": file_content,
+            "content_note": content_note,
             "instructions": instructions,
             "code_edit": code_edit,
             "model": model
@@ -311,76 +507,46 @@ class AnalyzeAndPlanChangesNode(Node):
     def exec(self, prep_res):
         logger.info("EditAgent-Analyze: Calling LLM to analyze and plan specific edits")
         
-        prompt = f"""You need to analyze the edit instructions and create a specific edit plan.
-
-CURRENT FILE CONTENT:
-```
-{prep_res['file_content']}
-```
-
-EDIT INSTRUCTIONS: {prep_res['instructions']}
-
-CODE EDIT TEMPLATE:
-```
-{prep_res['code_edit']}
-```
-
-Create a plan to apply these edits. Return a list of specific edit operations in YAML format.
-Each edit should specify the exact line numbers and replacement content.
-
-IMPORTANT:
-- Line numbers are 1-indexed
-- If inserting new content, use the same start_line and end_line
-- If deleting lines, set replacement to empty string
-- For replacements, specify the exact range to replace
-
-Output format:
-```yaml
-edits:
-  - start_line: 1
-    end_line: 3
-    replacement: |
-      new content here
-      can be multiple lines
-  - start_line: 10
-    end_line: 10
-    replacement: "single line replacement"
-```"""
+        prompt = _ANALYZE_PROMPT.substitute(
+            content_note=prep_res['content_note'],
+            file_content=prep_res['file_content'],
+            instructions=prep_res['instructions'],
+            code_edit=prep_res['code_edit']
+        )
 
         response = call_llm(prompt, prep_res['model'])
         
         try:
-            yaml_str = response.split("```yaml")[1].split("```")[0].strip()
-            result = yaml.safe_load(yaml_str)
+            result = _parse_response_block(response)
             edits = result.get("edits", [])
-            logger.info(f"EditAgent-Analyze: Successfully parsed edit plan with {len(edits)} operations")
+            logger.info("EditAgent-Analyze: Successfully parsed edit plan with %s operations", len(edits))
         except Exception as e:
-            logger.error(f"EditAgent-Analyze: Failed to parse edit plan: {e}")
+            logger.error("EditAgent-Analyze: Failed to parse edit plan: %s", e)
             edits = []
         
         # Validate and sort edits (descending order by start_line)
         valid_edits = []
         for edit in edits:
-            if all(key in edit for key in ["start_line", "end_line", "replacement"]):
+            if _REQUIRED_EDIT_KEYS.issubset(edit):
                 valid_edits.append(edit)
-                logger.info(f"EditAgent-Analyze: Valid edit - lines {edit['start_line']}-{edit['end_line']}")
+                logger.info("EditAgent-Analyze: Valid edit - lines %s-%s", edit['start_line'], edit['end_line'])
             else:
-                logger.warning(f"EditAgent-Analyze: Invalid edit skipped: {edit}")
+                logger.warning("EditAgent-Analyze: Invalid edit skipped: %s", edit)
         
         # Sort in descending order by start_line for safe application
-        valid_edits.sort(key=lambda x: x["start_line"], reverse=True)
-        logger.info(f"EditAgent-Analyze: Sorted {len(valid_edits)} valid edits for application")
+        valid_edits.sort(key=operator.itemgetter("start_line"), reverse=True)
+        logger.info("EditAgent-Analyze: Sorted %s valid edits for application", len(valid_edits))
         
         return valid_edits
     
     def post(self, shared, prep_res, exec_res):
         shared["edit_operations"] = exec_res
-        logger.info(f"EditAgent-Analyze: Stored {len(exec_res)} edit operations, proceeding to apply changes")
+        logger.info("EditAgent-Analyze: Stored %s edit operations, proceeding to apply changes", len(exec_res))
         return "apply_changes"
 
 
-class ApplyChangesBatchNode(BatchNode):
-    """Applies the planned edits to the file."""
+class ApplyChangesBatchNode(Node):
+    """Applies the planned edits to the file with a single read and write."""
     
     def prep(self, shared):
         edit_operations = shared.get("edit_operations", [])
@@ -388,37 +554,43 @@ class ApplyChangesBatchNode(BatchNode):
         target_file = last_action["params"].get("target_file", "")
         working_dir = shared["working_dir"]
         
-        logger.info(f"EditAgent-Apply: Preparing to apply {len(edit_operations)} edits to '{target_file}'")
+        logger.info("EditAgent-Apply: Preparing to apply %s edits to '%s'", len(edit_operations), target_file)
         
-        # Add target_file and working_dir to each edit operation for exec()
+        # Add target_file and working_dir to each edit operation for the result details
         enhanced_operations = []
+        log_edits = logger.isEnabledFor(logging.INFO)
         for i, op in enumerate(edit_operations):
             enhanced_op = op.copy()
             enhanced_op["target_file"] = target_file
             enhanced_op["working_dir"] = working_dir
             enhanced_operations.append(enhanced_op)
-            logger.info(f"EditAgent-Apply: Edit {i+1}: lines {op['start_line']}-{op['end_line']}")
+            if log_edits:
+                logger.info("EditAgent-Apply: Edit %s: lines %s-%s", i+1, op['start_line'], op['end_line'])
         
-        return enhanced_operations
+        return {"target_file": target_file, "working_dir": working_dir, "edits": enhanced_operations}
     
-    def exec(self, edit_operation):
-        # Note: BatchNode exec() doesn't have access to shared, so we need to pass the data through prep
-        # This is a limitation we need to work around
-        start_line = edit_operation["start_line"]
-        end_line = edit_operation["end_line"]
-        replacement = edit_operation["replacement"]
-        target_file = edit_operation["target_file"]
-        working_dir = edit_operation["working_dir"]
-        
-        logger.info(f"EditAgent-Apply: Applying edit to lines {start_line}-{end_line} in '{target_file}'")
-        success, message = replace_file(target_file, start_line, end_line, replacement, working_dir)
-        
-        if success:
-            logger.info(f"EditAgent-Apply: Successfully applied edit to lines {start_line}-{end_line}")
-        else:
-            logger.error(f"EditAgent-Apply: Failed to apply edit to lines {start_line}-{end_line}: {message}")
+    def exec(self, prep_res):
+        edits = prep_res["edits"]
+        if not edits:
+            return []
+        
+        # The edits touch disjoint ranges of one file, so apply them all in one rewrite
+        logger.info("EditAgent-Apply: Applying %s edits to '%s'", len(edits), prep_res['target_file'])
+        _, results = replace_file_batch(prep_res["target_file"], edits, prep_res["working_dir"])
+        
+        # A file-level failure returns one error for the whole batch
+        if len(results) != len(edits):
+            results = results * len(edits)
+        
+        exec_res_list = []
+        for edit, (success, message) in zip(edits, results):
+            if success:
+                logger.info("EditAgent-Apply: Successfully applied edit to lines %s-%s", edit['start_line'], edit['end_line'])
+            else:
+                logger.error("EditAgent-Apply: Failed to apply edit to lines %s-%s: %s", edit['start_line'], edit['end_line'], message)
+            exec_res_list.append({"success": success, "message": message, "edit": edit})
         
-        return {"success": success, "message": message, "edit": edit_operation}
+        return exec_res_list
     
     def post(self, shared, prep_res, exec_res_list):
         # Compile edit results
@@ -436,7 +608,7 @@ class ApplyChangesBatchNode(BatchNode):
         # Clear edit operations
         shared["edit_operations"] = []
         
-        logger.info(f"EditAgent-Apply: Edit process complete - {edit_summary['successful_edits']}/{edit_summary['total_edits']} edits successful")
+        logger.info("EditAgent-Apply: Edit process complete - %s/%s edits successful", edit_summary['successful_edits'], edit_summary['total_edits'])
         if all_success:
             logger.info("EditAgent-Apply: All edits applied successfully, returning to main agent")
         else:
@@ -445,77 +617,101 @@ class ApplyChangesBatchNode(BatchNode):
         return "decide_next"
 
 
+# Static parts of the FormatResponseNode prompt
+_RESPONSE_PROMPT_HEADER = string.Template("""Create a helpful response to the user based on the completed actions.
+
+ORIGINAL USER REQUEST: $user_query
+
+ACTIONS COMPLETED:
+""")
+
+_RESPONSE_PROMPT_FOOTER = """
+
+Provide a clear, helpful summary of what was accomplished. Be specific about:
+- What files were read, modified, or created
+- What searches were performed and their results  
+- Any issues encountered
+- Next steps if applicable
+
+Keep the response concise but informative."""
+
+
 class FormatResponseNode(Node):
     """Creates final response for user based on action history."""
     
     def prep(self, shared):
-        history = shared.get("history", [])
         user_query = shared["user_query"]
-        model = shared.get("model", "claude-sonnet-4-20250514")
+        model = shared.get("model", DEFAULT_MODEL)
+        history = compress(shared.get("history", []), model=model, cache=shared.setdefault("history_summary_cache", {}))
         
-        logger.info(f"FormatResponse: Generating final response for user query: '{user_query}'")
-        logger.info(f"FormatResponse: Processing {len(history)} completed actions")
+        logger.info("FormatResponse: Generating final response for user query: '%s'", user_query)
+        logger.info("FormatResponse: Processing %s completed actions", len(history))
         
-        return {"history": history, "user_query": user_query, "model": model}
+        return {
+            "history": history,
+            "user_query": user_query,
+            "model": model,
+            "blob_store": shared.get("blob_store", {})
+        }
     
     def exec(self, prep_res):
+        history = prep_res['history']
+        
+        # Nothing was done besides finishing: the decision's reason is the response
+        if len(history) == 1 and history[0]['tool'] == 'finish':
+            logger.info("FormatResponse: Only a finish action, skipping LLM call")
+            return history[0]['reason']
+        
         logger.info("FormatResponse: Calling LLM to generate final response")
         
-        prompt = f"""Create a helpful response to the user based on the completed actions.
-
-ORIGINAL USER REQUEST: {prep_res['user_query']}
-
-ACTIONS COMPLETED:
-"""
+        parts = [_RESPONSE_PROMPT_HEADER.substitute(user_query=prep_res['user_query'])]
         
         for i, action in enumerate(prep_res['history'], 1):
-            prompt += f"\n{i}. {action['tool']} - {action['reason']}\n"
+            parts.append(f"\n{i}. {action['tool']} - {action['reason']}\n")
             
             if action.get('result'):
                 result = action['result']
-                if action['tool'] == 'read_file':
-                    if result.get('success'):
-                        content_preview = result['content'][:200] + "..." if len(result['content']) > 200 else result['content']
-                        prompt += f"   ✓ Successfully read file. Content preview: {content_preview}\n"
-                    else:
-                        prompt += f"   ✗ Failed to read file: {result.get('content', 'Unknown error')}\n"
+                if action['tool'] == SUMMARY_TOOL:
+                    parts.append(f"   {result}\n")
+                    
+                elif action['tool'] == 'read_file':
+                    for file_result in result.get('files', [result]):
+                        if file_result.get('success'):
+                            content = prep_res['blob_store'].get(file_result.get('content_ref'), "")
+                            label = f" {file_result['file_path']}" if 'files' in result else ""
+                            parts.append(f"   ✓ Successfully read file{label}. Content preview: {_preview(content, 200)}\n")
+                        else:
+                            parts.append(f"   ✗ Failed to read file: {file_result.get('content', 'Unknown error')}\n")
                         
                 elif action['tool'] == 'grep_search':
                     if result.get('success'):
                         matches = result.get('matches', [])
-                        prompt += f"   ✓ Found {len(matches)} matches for '{result['query']}'\n"
+                        parts.append(f"   ✓ Found {len(matches)} matches for '{result['query']}'\n")
                         for match in matches[:3]:  # Show first 3 matches
-                            prompt += f"     - {match['file']}:{match['line']} {match['content'][:50]}...\n"
+                            parts.append(f"     - {match['file_path']}:{match['line_number']} {_preview(match['content'], 50)}\n")
                     else:
-                        prompt += f"   ✗ Search failed\n"
+                        parts.append("   ✗ Search failed\n")
                         
                 elif action['tool'] == 'list_dir':
                     if result.get('success'):
-                        prompt += f"   ✓ Listed directory contents\n"
+                        parts.append("   ✓ Listed directory contents\n")
                     else:
-                        prompt += f"   ✗ Failed to list directory\n"
+                        parts.append("   ✗ Failed to list directory\n")
                         
                 elif action['tool'] == 'edit_file':
                     if result.get('success'):
-                        prompt += f"   ✓ Successfully applied {result['successful_edits']}/{result['total_edits']} edits\n"
+                        parts.append(f"   ✓ Successfully applied {result['successful_edits']}/{result['total_edits']} edits\n")
                     else:
-                        prompt += f"   ✗ Edit failed: {result.get('details', 'Unknown error')}\n"
+                        parts.append(f"   ✗ Edit failed: {result.get('details', 'Unknown error')}\n")
                         
                 elif action['tool'] == 'delete_file':
                     if result.get('success'):
-                        prompt += f"   ✓ Successfully deleted file\n"
+                        parts.append("   ✓ Successfully deleted file\n")
                     else:
-                        prompt += f"   ✗ Failed to delete file: {result.get('message', 'Unknown error')}\n"
+                        parts.append(f"   ✗ Failed to delete file: {result.get('message', 'Unknown error')}\n")
 
-        prompt += f"""
-
-Provide a clear, helpful summary of what was accomplished. Be specific about:
-- What files were read, modified, or created
-- What searches were performed and their results  
-- Any issues encountered
-- Next steps if applicable
-
-Keep the response concise but informative."""
+        parts.append(_RESPONSE_PROMPT_FOOTER)
+        prompt = "".join(parts)
 
         response = call_llm(prompt, prep_res['model'])
         logger.info("FormatResponse: Successfully generated final response")
@@ -544,7 +740,7 @@ class AnswerNode(Node):
     def prep(self, shared):
         return {
             "question": shared["question"],
-            "model": shared.get("model", "claude-sonnet-4-20250514")
+            "model": shared.get("model", DEFAULT_MODEL)
         }
     
     def exec(self, prep_res):
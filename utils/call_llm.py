@@ -1,9 +1,55 @@
 import os
+import re
 import json
+import asyncio
+import sqlite3
+import hashlib
 import logging
-from typing import List, Dict, Any, Union
+import importlib.util
+import functools
+import threading
+from typing import List, Dict, Union
+from utils.providers import DEFAULT_MODEL, LLM_TEMPERATURE
+from utils.call_llm_async import call_llm_async, gather_llm
 
-def call_llm(prompt: Union[str, List[Dict[str, str]]], model: str = "claude-sonnet-4-20250514") -> str:
+# call_llm_async and gather_llm are re-exported so all LLM helpers import from one module
+__all__ = [
+    "call_llm", "call_llm_batch", "call_llm_with_retries",
+    "call_llm_async", "gather_llm", "LLM_TEMPERATURE", "LLM_CACHE_PATH"
+]
+
+# Imported once at module load; litellm's import is slow and loads every provider
+try:
+    import litellm
+except ImportError:
+    litellm = None
+
+try:
+    import httpx  # installed with litellm
+except ImportError:
+    httpx = None
+
+# Persistent prompt -> response cache shared across runs, used when POCKETFLOW_LLM_CACHE=1
+LLM_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pocketflow", "llm.sqlite"
+)
+
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+# Keep-alive HTTP client created at import and shared by every LLM call,
+# so the TCP and TLS handshakes are paid once per process rather than per call.
+# HTTP/2 (one multiplexed connection per host) is used when the optional h2 package is installed.
+_HTTP_CLIENT = httpx.Client(
+    http2=importlib.util.find_spec("h2") is not None,
+    timeout=httpx.Timeout(600.0, connect=30.0),
+    limits=httpx.Limits(max_keepalive_connections=64, max_connections=128)
+) if httpx is not None else None
+
+if litellm is not None and _HTTP_CLIENT is not None and litellm.client_session is None:
+    litellm.client_session = _HTTP_CLIENT
+
+def call_llm(prompt: Union[str, List[Dict[str, str]]], model: str = DEFAULT_MODEL, cache: bool = False) -> str:
     """
     Makes API calls to language model services using LiteLLM for multi-provider support
     
@@ -17,29 +63,92 @@ def call_llm(prompt: Union[str, List[Dict[str, str]]], model: str = "claude-sonn
         - ANTHROPIC_API_KEY: For Claude models  
         - GOOGLE_API_KEY: For Gemini models
     
+    Every call queries the model unless cache=True. Cached responses are kept
+    in memory by model and messages, so byte-identical prompts skip the API
+    call; with POCKETFLOW_LLM_CACHE=1 they are also kept in a SQLite database
+    at LLM_CACHE_PATH and reused across runs. Calls are made at temperature
+    LLM_TEMPERATURE (0.1), so caching trades the model's small run-to-run
+    variation for speed.
+    
     Args:
         prompt: Either a string prompt or list of messages
-        model: Model name to use
+        model: Model name to use (DEFAULT_MODEL, set by POCKETFLOW_LLM_MODEL, if omitted)
+        cache: Whether to serve/store the response from the cache. Only pass
+            True for prompts whose answer may be reused for the life of the process.
         
     Returns:
         LLM response text
     """
+    # Convert string prompt to messages format if needed
+    if isinstance(prompt, str):
+        messages = [{"role": "user", "content": prompt}]
+    else:
+        messages = prompt
+    
+    if cache:
+        return _cached_completion(model, json.dumps(messages, sort_keys=True))
+    return _completion(messages, model)
+
+@functools.lru_cache(maxsize=512)
+def _cached_completion(model: str, messages_json: str) -> str:
+    """
+    In-process LRU layer over the optional on-disk cache. Failed calls raise and are not cached.
+    """
+    if os.environ.get("POCKETFLOW_LLM_CACHE") != "1":
+        return _completion(json.loads(messages_json), model)
+    
+    key = hashlib.sha256(f"{model}\n{LLM_TEMPERATURE}\n{messages_json}".encode("utf-8")).hexdigest()
+    
     try:
-        import litellm
+        with _cache_lock:
+            row = _cache_db().execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            logging.info(f"LLM cache hit for model: {model}")
+            return row[0]
+    except Exception as e:
+        logging.warning(f"LLM cache unavailable, calling model directly: {e}")
+    
+    response = _completion(json.loads(messages_json), model)
+    
+    try:
+        with _cache_lock:
+            conn = _cache_db()
+            conn.execute("INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)", (key, response))
+            conn.commit()
+    except Exception as e:
+        logging.warning(f"Failed to store LLM response in cache: {e}")
+    
+    return response
+
+def _cache_db() -> sqlite3.Connection:
+    """
+    Open the cache database once per process (WAL mode, so concurrent runs can read while one writes)
+    """
+    global _cache_conn
+    if _cache_conn is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+        conn.commit()
+        _cache_conn = conn
+    return _cache_conn
+
+def _completion(messages: List[Dict[str, str]], model: str) -> str:
+    """
+    Send messages to the model through LiteLLM and return the response text
+    """
+    try:
+        if litellm is None:
+            raise ImportError("litellm is required for LLM calls (pip install litellm)")
         
         # Log which model is being used
         logging.info(f"LLM call initiated with model: {model}")
         
-        # Convert string prompt to messages format if needed
-        if isinstance(prompt, str):
-            messages = [{"role": "user", "content": prompt}]
-        else:
-            messages = prompt
-        
         response = litellm.completion(
             model=model,
             messages=messages,
-            temperature=0.1  # Lower temperature for more consistent responses
+            temperature=LLM_TEMPERATURE  # Lower temperature for more consistent responses
         )
         
         logging.info(f"LLM call completed successfully with model: {model}")
@@ -49,24 +158,78 @@ def call_llm(prompt: Union[str, List[Dict[str, str]]], model: str = "claude-sonn
         logging.error(f"LLM call failed with model {model}: {e}")
         raise
 
-def call_llm_with_retries(prompt: Union[str, List[Dict[str, str]]], model: str = "claude-sonnet-4-20250514", max_retries: int = 3) -> str:
+# Row markers used to pack several prompts into one request
+_ROW_MARKER = "<<ROW {}>>"
+_ROW_MARKER_RE = re.compile(r"^<<ROW (\d+)>>[ \t]*$", re.MULTILINE)
+
+_BATCH_INSTRUCTIONS = """Answer each of the {count} prompts below independently, in order.
+Begin each answer with its marker line exactly as given (e.g. <<ROW 1>>) and put nothing else on that line.
+Do not add any text before the first marker.
+
+"""
+
+def call_llm_batch(prompts: List[str], model: str = DEFAULT_MODEL, batch_size: int = 20) -> List[str]:
     """
-    Call LLM with retry logic for better reliability
+    Answers many independent prompts with one LLM request per batch_size prompts
+    
+    Each chunk is sent as a single message with the prompts separated by
+    "<<ROW i>>" markers, and the response is split back on the same markers.
+    Rows missing from a response are answered with an individual call_llm call.
+    
+    Args:
+        prompts: Independent prompt strings
+        model: Model name to use
+        batch_size: Maximum number of prompts packed into one request
+        
+    Returns:
+        One response string per prompt, in the same order
+    """
+    responses = []
+    for start in range(0, len(prompts), batch_size):
+        chunk = prompts[start:start + batch_size]
+        if len(chunk) == 1:
+            responses.append(call_llm(chunk[0], model))
+            continue
+        
+        parts = [_BATCH_INSTRUCTIONS.format(count=len(chunk))]
+        for i, prompt in enumerate(chunk, 1):
+            parts.append(f"{_ROW_MARKER.format(i)}\n{prompt}\n\n")
+        
+        logging.info(f"LLM batch call with {len(chunk)} prompts, model: {model}")
+        rows = _split_rows(call_llm("".join(parts), model), len(chunk))
+        
+        for i, prompt in enumerate(chunk, 1):
+            if i in rows:
+                responses.append(rows[i])
+            else:
+                logging.warning(f"LLM batch response is missing row {i}, calling it individually")
+                responses.append(call_llm(prompt, model))
+    
+    return responses
+
+def _split_rows(text: str, count: int) -> Dict[int, str]:
+    """
+    Split a batched response into {row number: answer}, ignoring out-of-range markers
     """
-    import time
+    markers = list(_ROW_MARKER_RE.finditer(text))
+    rows = {}
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        row = int(marker.group(1))
+        if 1 <= row <= count and row not in rows:
+            end = next_marker.start() if next_marker else len(text)
+            rows[row] = text[marker.end():end].strip()
+    return rows
+
+def call_llm_with_retries(prompt: Union[str, List[Dict[str, str]]], model: str = DEFAULT_MODEL, max_retries: int = 3) -> str:
+    """
+    Call LLM with retry logic for better reliability
     
+    Blocking wrapper over utils.call_llm_async.call_llm_async; must not be
+    called from inside a running event loop (await call_llm_async there instead).
+    Responses are not served from the call_llm cache.
+    """
     logging.info(f"LLM retry call initiated with model: {model}, max_retries: {max_retries}")
-    
-    for attempt in range(max_retries):
-        try:
-            return call_llm(prompt, model)
-        except Exception as e:
-            if attempt == max_retries - 1:
-                logging.error(f"LLM retry call failed after {max_retries} attempts with model: {model}")
-                raise
-            wait_time = 2 ** attempt  # Exponential backoff
-            time.sleep(wait_time)
-            logging.warning(f"LLM call attempt {attempt + 1} failed with model: {model}, retrying in {wait_time}s: {e}")
+    return asyncio.run(call_llm_async(prompt, model, max_retries=max_retries))
 
 if __name__ == "__main__":
     # Test the function with different models
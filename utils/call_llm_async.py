@@ -0,0 +1,113 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import List, Dict, Optional, Union
+from utils.providers import DEFAULT_MODEL, LLM_TEMPERATURE, rpm_for
+
+try:
+    import litellm
+except ImportError:
+    litellm = None
+
+class RateLimiter:
+    """
+    Sliding-window requests-per-minute limiter shared by concurrent calls
+    """
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self._sent = deque()
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Wait until one more request fits in the last 60 seconds, then record it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= 60:
+                    self._sent.popleft()
+                if len(self._sent) < self.rpm:
+                    self._sent.append(now)
+                    return
+                await asyncio.sleep(60 - (now - self._sent[0]))
+
+async def call_llm_async(
+    prompt: Union[str, List[Dict[str, str]]],
+    model: str = DEFAULT_MODEL,
+    max_retries: int = 3,
+    limiter: Optional[RateLimiter] = None
+) -> str:
+    """
+    Async LLM call through LiteLLM with exponential backoff between attempts
+
+    Args:
+        prompt: Either a string prompt or list of messages
+        model: Model name to use
+        max_retries: Number of attempts before the last error is raised
+        limiter: Optional RateLimiter awaited before every attempt
+
+    Returns:
+        LLM response text
+    """
+    if litellm is None:
+        raise ImportError("litellm is required for LLM calls (pip install litellm)")
+
+    # Convert string prompt to messages format if needed
+    if isinstance(prompt, str):
+        messages = [{"role": "user", "content": prompt}]
+    else:
+        messages = prompt
+
+    for attempt in range(max_retries):
+        if limiter is not None:
+            await limiter.wait()
+        try:
+            response = await litellm.acompletion(
+                model=model,
+                messages=messages,
+                temperature=LLM_TEMPERATURE  # Lower temperature for more consistent responses
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            if attempt == max_retries - 1:
+                logging.error(f"Async LLM call failed after {max_retries} attempts with model: {model}")
+                raise
+            wait_time = 2 ** attempt  # Exponential backoff
+            logging.warning(f"Async LLM call attempt {attempt + 1} failed with model: {model}, retrying in {wait_time}s: {e}")
+            await asyncio.sleep(wait_time)
+
+async def gather_llm(
+    prompts: List[Union[str, List[Dict[str, str]]]],
+    model: str = DEFAULT_MODEL,
+    max_concurrency: int = 48,
+    rpm: Optional[int] = None
+) -> List[str]:
+    """
+    Runs many LLM calls concurrently while staying under a requests-per-minute limit
+
+    Args:
+        prompts: Prompts (strings or message lists) to send
+        model: Model name to use
+        max_concurrency: Maximum number of requests in flight at once
+        rpm: Maximum number of requests started in any 60 second window
+            (defaults to the provider limit from utils.providers.rpm_for)
+
+    Returns:
+        One response string per prompt, in the same order
+    """
+    if rpm is None:
+        rpm = rpm_for(model)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = RateLimiter(rpm)
+
+    async def run(prompt):
+        async with semaphore:
+            return await call_llm_async(prompt, model, limiter=limiter)
+
+    logging.info(f"Gathering {len(prompts)} LLM calls with model: {model}, max_concurrency: {max_concurrency}, rpm: {rpm}")
+    return await asyncio.gather(*(run(prompt) for prompt in prompts))
+
+if __name__ == "__main__":
+    # Test the function (requires an API key for the model)
+    prompts = ["Say 'one' and nothing else.", "Say 'two' and nothing else."]
+    print(asyncio.run(gather_llm(prompts)))
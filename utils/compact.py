@@ -0,0 +1,62 @@
+import hashlib
+from typing import Dict, Any, Optional
+
+def compact_tool_result(tool: str, result: Dict[str, Any], store: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Shrinks a tool result before it is stored in the action history
+
+    Matches that survive are kept byte-identical, so file paths and line
+    numbers stay exact:
+        - grep_search: matches repeating an earlier (file_path, line_number) are dropped
+    read_file content is never altered: the model plans line-numbered edits
+    from it, so it must match the file on disk. Other tools and failed
+    results are returned unchanged.
+
+    Args:
+        tool: Name of the tool that produced the result
+        result: The tool result dict
+        store: Optional dict to keep the original result in when compaction
+            removes anything; the compacted result then carries its key
+            under "result_full"
+
+    Returns:
+        The compacted result (a new dict), or the original result if nothing changed
+    """
+    if not result.get("success") or tool != "grep_search":
+        return result
+
+    matches = result.get("matches", [])
+    deduped = _dedupe_matches(matches)
+    if len(deduped) == len(matches):
+        return result
+    new_result = dict(result, matches=deduped)
+
+    if store is not None:
+        key = hashlib.sha1(repr(matches).encode("utf-8")).hexdigest()
+        store[key] = result
+        new_result["result_full"] = key
+
+    return new_result
+
+def _dedupe_matches(matches: list) -> list:
+    """
+    Keep the first match for each (file_path, line_number)
+    """
+    seen = set()
+    deduped = []
+    for match in matches:
+        key = (match.get("file_path"), match.get("line_number"))
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append(match)
+    return deduped
+
+if __name__ == "__main__":
+    # Test the function
+    match = {"file_path": "a.py", "line_number": 3, "content": "x x", "match_text": "x"}
+    result = {"success": True, "matches": [match, dict(match, match_start=2)], "query": "x"}
+    store = {}
+    compacted = compact_tool_result("grep_search", result, store)
+    print(f"{len(result['matches'])} -> {len(compacted['matches'])} matches")
+    print(f"Original stored under: {compacted.get('result_full')}")
@@ -0,0 +1,91 @@
+import logging
+from typing import List, Dict, Any, Optional
+from utils.call_llm import call_llm
+from utils.providers import DEFAULT_MODEL
+
+# Tool name used for the synthetic entry that replaces summarized turns
+SUMMARY_TOOL = "__summary__"
+
+P_HIST = """Summarize the following coding agent actions for use as context in later steps.
+Keep file paths, search queries, line numbers and error messages exactly as written.
+Be concise: one short line per action is enough.
+
+ACTIONS:
+{actions}"""
+
+def compress(
+    history: List[Dict[str, Any]],
+    t_hist: int = 20,
+    keep_k: int = 5,
+    model: str = DEFAULT_MODEL,
+    cache: Optional[Dict[Any, str]] = None,
+    block_size: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    Compresses a long action history into one summary entry plus the most recent turns
+
+    Older turns are summarized in fixed blocks of block_size entries, so a
+    block's summary (and its cache key) stays the same as the history grows
+    and a new summarization call is made only once per block_size turns.
+
+    Args:
+        history: List of action entries ({tool, reason, params, result, timestamp})
+        t_hist: Only compress when the history has more than this many entries
+        keep_k: Minimum number of most recent entries to keep verbatim
+        model: Model used to write the summary
+        cache: Optional dict (e.g. shared["history_summary_cache"]) mapping each
+            summarized block to its summary, so blocks are summarized once
+        block_size: Number of older entries summarized together
+
+    Returns:
+        The history unchanged if under the threshold, otherwise
+        [summary_entry] + the entries after the last full block
+        (between keep_k and keep_k + block_size - 1 of them)
+    """
+    if len(history) <= t_hist:
+        return history
+
+    boundary = (len(history) - keep_k) // block_size * block_size
+    if boundary == 0:
+        return history
+    recent_turns = history[boundary:]
+
+    summaries = []
+    for start in range(0, boundary, block_size):
+        block = history[start:start + block_size]
+        key = hash(tuple((action.get("tool"), action.get("timestamp")) for action in block))
+        summary = cache.get(key) if cache is not None else None
+
+        if summary is None:
+            logging.info(f"Compressing history entries {start + 1}-{start + len(block)} into a summary")
+            lines = []
+            for i, action in enumerate(block, start + 1):
+                lines.append(f"{i}. {action.get('tool')}: {action.get('reason')}")
+                if action.get("result"):
+                    result_str = str(action["result"])
+                    lines.append(f"   Result: {result_str[:500]}")
+
+            try:
+                # A finished block's summary never changes, so it may come from the response cache
+                summary = call_llm(P_HIST.format(actions="\n".join(lines)), model, cache=True)
+            except Exception as e:
+                # Keep the flow going with the uncompressed history
+                logging.warning(f"History compression failed, using full history: {e}")
+                return history
+
+            if cache is not None:
+                cache[key] = summary
+        summaries.append(summary)
+
+    summary_entry = {
+        "tool": SUMMARY_TOOL,
+        "reason": f"Summary of {boundary} earlier actions",
+        "params": {},
+        "result": "\n".join(summaries)
+    }
+    return [summary_entry] + recent_turns
+
+if __name__ == "__main__":
+    # Test the function with a short history (returned unchanged, no LLM call)
+    history = [{"tool": "read_file", "reason": "Read README", "result": {"success": True}}]
+    print(compress(history))
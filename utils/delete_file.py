@@ -1,37 +1,41 @@
 import os
+import mmap
+import stat
+import shutil
 import logging
-from typing import Tuple
+import tempfile
+from typing import Tuple, Union
+from utils.working_dir import WorkingDir, OutsideWorkingDirError, safe_join
+from utils.replace_file import _count_lines
 
-def delete_file(target_file: str, working_dir: str = ".") -> Tuple[bool, str]:
+def delete_file(target_file: str, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, str]:
     """
     Deletes a file from the file system
     
     Args:
         target_file: Path to the file (relative to working_dir)
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, result_message)
     """
     try:
-        # Construct absolute path
-        abs_path = os.path.abspath(os.path.join(working_dir, target_file))
-        
-        # Security check: ensure the path is within working_dir
-        abs_working_dir = os.path.abspath(working_dir)
-        if not abs_path.startswith(abs_working_dir):
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, target_file)
+        except OutsideWorkingDirError:
             return False, f"Error: Path {target_file} is outside working directory"
         
-        # Check if file exists
-        if not os.path.exists(abs_path):
+        # Check that the file exists and is a regular file (not a directory) with one stat call
+        try:
+            st = os.stat(abs_path)
+        except (FileNotFoundError, NotADirectoryError):
             return False, f"Error: File {target_file} does not exist"
-        
-        # Check if it's actually a file (not a directory)
-        if not os.path.isfile(abs_path):
+        if not stat.S_ISREG(st.st_mode):
             return False, f"Error: {target_file} is not a file (it may be a directory)"
         
         # Delete the file
-        os.remove(abs_path)
+        os.unlink(abs_path)
         
         success_msg = f"Successfully deleted file: {target_file}"
         logging.info(success_msg)
@@ -46,7 +50,7 @@ def delete_file(target_file: str, working_dir: str = ".") -> Tuple[bool, str]:
         logging.error(error_msg)
         return False, error_msg
 
-def remove_file_content(target_file: str, start_line: int = None, end_line: int = None, working_dir: str = ".") -> Tuple[bool, str]:
+def remove_file_content(target_file: str, start_line: int = None, end_line: int = None, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, str]:
     """
     Removes content from a file based on line numbers
     
@@ -54,33 +58,44 @@ def remove_file_content(target_file: str, start_line: int = None, end_line: int
         target_file: Path to the file (relative to working_dir)
         start_line: First line to remove (1-indexed). If None, remove from beginning
         end_line: Last line to remove (1-indexed, inclusive). If None, remove to end
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, result_message)
     """
     try:
-        # Construct absolute path
-        abs_path = os.path.abspath(os.path.join(working_dir, target_file))
-        
-        # Security check: ensure the path is within working_dir
-        abs_working_dir = os.path.abspath(working_dir)
-        if not abs_path.startswith(abs_working_dir):
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, target_file)
+        except OutsideWorkingDirError:
             return False, f"Error: Path {target_file} is outside working directory"
         
-        # Check if file exists
-        if not os.path.exists(abs_path):
+        # Check that the file exists and is a regular file with one stat call
+        try:
+            st = os.stat(abs_path)
+        except (FileNotFoundError, NotADirectoryError):
             return False, f"Error: File {target_file} does not exist"
-        
-        # Check if it's actually a file
-        if not os.path.isfile(abs_path):
+        if not stat.S_ISREG(st.st_mode):
             return False, f"Error: {target_file} is not a file"
         
-        # Read the current file content
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        total_lines = len(lines)
+        # Clearing the whole file needs no reading: truncate it in place
+        if start_line in (None, 1) and end_line is None:
+            with open(abs_path, 'r+b') as f:
+                f.truncate(0)
+            success_msg = f"Successfully cleared all content from {target_file}"
+            logging.info(success_msg)
+            return True, success_msg
+        
+        # Count lines on a read-only map of the file instead of loading it,
+        # with the same rule replace_file_batch validates against
+        with open(abs_path, 'rb') as f:
+            # mmap cannot map an empty file, which has no lines anyway
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b""
+            try:
+                total_lines = _count_lines(data)
+            finally:
+                if st.st_size:
+                    data.close()
         
         # Handle default values
         if start_line is None:
@@ -98,16 +113,19 @@ def remove_file_content(target_file: str, start_line: int = None, end_line: int
         if start_line > end_line:
             return False, f"Error: start_line {start_line} cannot be greater than end_line {end_line}"
         
-        # Convert to 0-indexed for list operations
-        start_idx = start_line - 1
-        end_idx = end_line  # end_line is inclusive, so we don't subtract 1
-        
-        # Create new file content by removing specified lines
-        new_lines = lines[:start_idx] + lines[end_idx:]
-        
-        # Write back to file
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
+        # Stream the kept lines into a temp file next to the original, then swap it in atomically
+        tmp = tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(abs_path), delete=False)
+        try:
+            with open(abs_path, 'rb') as src, tmp:
+                for i, line in enumerate(src, 1):
+                    if start_line <= i <= end_line:
+                        continue
+                    tmp.write(line)
+            shutil.copymode(abs_path, tmp.name)
+            os.replace(tmp.name, abs_path)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
         
         if start_line == 1 and end_line == total_lines:
             success_msg = f"Successfully cleared all content from {target_file}"
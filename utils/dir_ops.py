@@ -1,38 +1,47 @@
+import io
 import os
+import re
+import stat
+import shutil
 import logging
-from typing import Tuple
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Optional, Union, Dict, Literal
+from utils.working_dir import WorkingDir, OutsideWorkingDirError, safe_join
 
-def list_dir(relative_workspace_path: str, working_dir: str = ".") -> Tuple[bool, str]:
+# du binary, used for size-only directory stats
+_DU = shutil.which("du")
+
+_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+# Entries never shown in the tree visualization: hidden names (.git, .vscode, ...)
+# and common generated or environment directories
+_IGNORE_RE = re.compile(r"^(?:\.|(?:__pycache__|node_modules|venv|env)$)")
+
+def list_dir(relative_workspace_path: str, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, str]:
     """
     Lists contents of a directory with a tree visualization
     
     Args:
         relative_workspace_path: Path to list contents of (relative to working_dir)
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, tree_visualization_string)
     """
     try:
-        # Handle root directory case
-        if relative_workspace_path in [".", "", "/"]:
-            target_path = working_dir
-        else:
-            target_path = os.path.join(working_dir, relative_workspace_path)
-        
-        abs_path = os.path.abspath(target_path)
-        abs_working_dir = os.path.abspath(working_dir)
-        
-        # Security check: ensure the path is within working_dir
-        if not abs_path.startswith(abs_working_dir):
+        # Handle root directory case, otherwise ensure the path is within working_dir
+        try:
+            abs_path = safe_join(working_dir, "" if relative_workspace_path in [".", "", "/"] else relative_workspace_path)
+        except OutsideWorkingDirError:
             return False, f"Error: Path {relative_workspace_path} is outside working directory"
         
-        # Check if directory exists
-        if not os.path.exists(abs_path):
+        # Check that the directory exists and is a directory with one stat call
+        try:
+            st = os.stat(abs_path)
+        except (FileNotFoundError, NotADirectoryError):
             return False, f"Error: Directory {relative_workspace_path} does not exist"
-        
-        # Check if it's actually a directory
-        if not os.path.isdir(abs_path):
+        if not stat.S_ISDIR(st.st_mode):
             return False, f"Error: {relative_workspace_path} is not a directory"
         
         # Generate tree visualization
@@ -62,167 +71,261 @@ def _generate_tree(directory_path: str, display_name: str, max_depth: int = 3, m
     Returns:
         String representation of the directory tree
     """
-    lines = []
+    buf = io.StringIO()
     item_count = 0
     
-    def _walk_directory(path: str, prefix: str = "", depth: int = 0) -> None:
-        nonlocal item_count
-        
-        if depth > max_depth or item_count >= max_items:
-            return
-        
+    # Depth-first walk with an explicit stack instead of recursion. Each frame is
+    # [sorted entries, next index, prefix, depth, number of entries not shown]
+    stack = []
+    
+    def _open_directory(path: str, prefix: str, depth: int) -> None:
         try:
-            # Get directory contents
-            items = os.listdir(path)
-            
-            # Filter out hidden files and common ignore patterns
-            filtered_items = []
-            for item in items:
-                if not item.startswith('.'):  # Skip hidden files
-                    if item not in {'__pycache__', 'node_modules', '.git', 'venv', 'env', '.vscode', '.idea'}:
-                        filtered_items.append(item)
+            # Get directory contents; DirEntry caches the file type from the directory read
+            with os.scandir(path) as it:
+                # Filter out hidden files and common ignore patterns
+                filtered_items = [entry for entry in it if not _IGNORE_RE.match(entry.name)]
             
             # Sort items: directories first, then files
             dirs = []
             files = []
-            for item in filtered_items:
-                item_path = os.path.join(path, item)
-                if os.path.isdir(item_path):
-                    dirs.append(item)
-                else:
-                    files.append(item)
-            
-            sorted_items = sorted(dirs) + sorted(files)
-            
-            # Limit items shown if too many
-            if len(sorted_items) > 20:
-                sorted_items = sorted_items[:20]
-                show_truncated = True
-            else:
-                show_truncated = False
-            
-            for i, item in enumerate(sorted_items):
-                if item_count >= max_items:
-                    break
-                
-                item_path = os.path.join(path, item)
-                is_last = (i == len(sorted_items) - 1) and not show_truncated
-                
-                # Choose the appropriate tree characters
-                if is_last:
-                    current_prefix = f"{prefix}└── "
-                    next_prefix = f"{prefix}    "
-                else:
-                    current_prefix = f"{prefix}├── "
-                    next_prefix = f"{prefix}│   "
-                
-                # Add file/directory info
-                if os.path.isdir(item_path):
-                    lines.append(f"{current_prefix}{item}/")
-                    item_count += 1
-                    
-                    # Recursively process subdirectory
-                    if depth < max_depth and item_count < max_items:
-                        _walk_directory(item_path, next_prefix, depth + 1)
+            for entry in filtered_items:
+                if entry.is_dir():
+                    dirs.append(entry)
                 else:
-                    # Show file with size info
-                    try:
-                        size = os.path.getsize(item_path)
-                        size_str = _format_file_size(size)
-                        lines.append(f"{current_prefix}{item} ({size_str})")
-                    except:
-                        lines.append(f"{current_prefix}{item}")
-                    item_count += 1
+                    files.append(entry)
             
-            # Show truncation message if needed
-            if show_truncated:
-                lines.append(f"{prefix}... ({len(filtered_items) - 20} more items)")
-                
+            sorted_items = sorted(dirs, key=_entry_name) + sorted(files, key=_entry_name)
         except PermissionError:
-            lines.append(f"{prefix}[Permission Denied]")
+            buf.write(f"{prefix}[Permission Denied]\n")
+            return
         except Exception as e:
-            lines.append(f"{prefix}[Error: {str(e)}]")
+            buf.write(f"{prefix}[Error: {str(e)}]\n")
+            return
+        
+        # Limit items shown if too many
+        stack.append([sorted_items[:20], 0, prefix, depth, max(0, len(sorted_items) - 20)])
     
     # Start with the root directory
-    lines.append(f"{display_name}/")
-    _walk_directory(directory_path)
+    buf.write(f"{display_name}/\n")
+    if max_depth >= 0 and max_items > 0:
+        _open_directory(directory_path, "", 0)
+    
+    while stack:
+        frame = stack[-1]
+        items, i, prefix, depth, hidden = frame
+        
+        if i == len(items) or item_count >= max_items:
+            # Show truncation message if needed
+            if hidden:
+                buf.write(f"{prefix}... ({hidden} more items)\n")
+            stack.pop()
+            continue
+        frame[1] = i + 1
+        
+        entry = items[i]
+        is_last = i == len(items) - 1 and not hidden
+        try:
+            is_dir = entry.is_dir()
+        except Exception as e:
+            # An unreadable entry ends its directory's listing
+            buf.write(f"{prefix}[Error: {str(e)}]\n")
+            stack.pop()
+            continue
+        
+        # Choose the appropriate tree characters
+        buf.write(prefix)
+        buf.write("└── " if is_last else "├── ")
+        buf.write(entry.name)
+        item_count += 1
+        
+        # Add file/directory info
+        if is_dir:
+            buf.write("/\n")
+            
+            # Descend into the subdirectory before its next sibling
+            if depth < max_depth and item_count < max_items:
+                _open_directory(entry.path, prefix + ("    " if is_last else "│   "), depth + 1)
+        else:
+            # Show file with size info
+            try:
+                buf.write(f" ({_format_file_size(entry.stat().st_size)})\n")
+            except:
+                buf.write("\n")
     
     # Add summary
     if item_count >= max_items:
-        lines.append(f"\n... (showing first {max_items} items)")
+        buf.write(f"\n... (showing first {max_items} items)\n")
     
-    return "\n".join(lines)
+    # Drop the final newline
+    return buf.getvalue()[:-1]
+
+def _entry_name(entry: os.DirEntry) -> str:
+    return entry.name
+
+def _scan_tree(path: str, recursive: bool = True):
+    """
+    Yield the non-hidden DirEntries below path, like os.walk without building
+    per-directory name lists. Symlinked directories are yielded but not entered;
+    unreadable directories are skipped.
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = [entry for entry in it if not entry.name.startswith('.')]
+    except OSError:
+        return
+    
+    for entry in entries:
+        yield entry
+        if recursive and entry.is_dir() and not entry.is_symlink():
+            yield from _scan_tree(entry.path)
+
+def _scan_subtree(path: str, with_types: bool) -> Tuple[int, int, int, Optional[Dict[str, int]]]:
+    """
+    Count (files, directories, total size, files per extension or None) below path
+    """
+    file_count = 0
+    dir_count = 0
+    total_size = 0
+    file_types = {} if with_types else None
+    
+    for entry in _scan_tree(path):
+        if entry.is_dir():
+            dir_count += 1
+        else:
+            file_count += 1
+            if file_types is not None:
+                _add_file_type(file_types, entry.name)
+            try:
+                total_size += entry.stat().st_size
+            except OSError:
+                pass  # Skip files we can't access
+    
+    return file_count, dir_count, total_size, file_types
+
+def _du_total_size(abs_path: str) -> Optional[int]:
+    """
+    Apparent size in bytes of everything under abs_path except hidden entries,
+    as reported by GNU `du -sb` (this includes the directories' own entries)
+    
+    Returns:
+        The total size, or None if du is unavailable or failed (e.g. BSD du has no -b)
+    """
+    try:
+        proc = subprocess.run(
+            [_DU, "-sb", "--exclude=.*", abs_path],
+            capture_output=True, timeout=60
+        )
+        if proc.returncode != 0:
+            return None
+        return int(proc.stdout.split(None, 1)[0])
+    except (OSError, subprocess.SubprocessError, ValueError, IndexError):
+        return None
+
+def _add_file_type(file_types: Dict[str, int], name: str) -> None:
+    extension = os.path.splitext(name)[1] or "(none)"
+    file_types[extension] = file_types.get(extension, 0) + 1
 
 def _format_file_size(size_bytes: int) -> str:
     """
     Format file size in human-readable format
     """
-    if size_bytes == 0:
-        return "0 B"
-    
-    size_names = ["B", "KB", "MB", "GB"]
-    import math
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    if i >= len(size_names):
-        i = len(size_names) - 1
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
     
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 1)
+    # Each unit is 2**10 times the previous one, so the bit length picks the unit;
+    # tenths of the unit are rounded half-to-even (like round()) in integer arithmetic
+    i = min((size_bytes.bit_length() - 1) // 10, len(_UNITS) - 1)
+    shift = i * 10
+    tenths, remainder = divmod(size_bytes * 10, 1 << shift)
+    half = 1 << (shift - 1)
+    if remainder > half or (remainder == half and tenths & 1):
+        tenths += 1
+    whole, tenth = divmod(tenths, 10)
     
     # Remove .0 for whole numbers
-    if s == int(s):
-        s = int(s)
-    
-    return f"{s} {size_names[i]}"
+    return f"{whole} {_UNITS[i]}" if tenth == 0 else f"{whole}.{tenth} {_UNITS[i]}"
 
-def get_directory_stats(relative_workspace_path: str, working_dir: str = ".") -> Tuple[bool, dict]:
+def get_directory_stats(
+    relative_workspace_path: str,
+    working_dir: Union[str, WorkingDir] = ".",
+    detail_level: Literal["size_only", "full"] = "full",
+    include_file_types: bool = False
+) -> Tuple[bool, dict]:
     """
     Get statistics about a directory (file count, total size, etc.)
     
     Args:
         relative_workspace_path: Path to analyze (relative to working_dir)
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
+        detail_level: How much to compute:
+            - "size_only": only total_size / total_size_formatted, from `du -sb`
+              when available (which also counts directory entries)
+            - "full": file_count, directory_count and the total size
+        include_file_types: With "full", also return file_types, the number
+            of files per extension
         
     Returns:
         Tuple of (success_status, stats_dict_or_error)
     """
     try:
-        if relative_workspace_path in [".", "", "/"]:
-            target_path = working_dir
-        else:
-            target_path = os.path.join(working_dir, relative_workspace_path)
+        if detail_level not in ("size_only", "full"):
+            return False, {"error": f"Invalid detail_level {detail_level!r}"}
         
-        abs_path = os.path.abspath(target_path)
-        abs_working_dir = os.path.abspath(working_dir)
-        
-        if not abs_path.startswith(abs_working_dir):
+        try:
+            abs_path = safe_join(working_dir, "" if relative_workspace_path in [".", "", "/"] else relative_workspace_path)
+        except OutsideWorkingDirError:
             return False, {"error": f"Path {relative_workspace_path} is outside working directory"}
         
-        if not os.path.exists(abs_path):
+        try:
+            st = os.stat(abs_path)
+        except (FileNotFoundError, NotADirectoryError):
             return False, {"error": f"Directory {relative_workspace_path} does not exist"}
-        
-        if not os.path.isdir(abs_path):
+        if not stat.S_ISDIR(st.st_mode):
             return False, {"error": f"{relative_workspace_path} is not a directory"}
         
-        # Calculate stats
+        # Let du sum the sizes when nothing else is needed
+        total_size = _du_total_size(abs_path) if detail_level == "size_only" and _DU else None
+        if total_size is not None:
+            return True, {"total_size": total_size, "total_size_formatted": _format_file_size(total_size)}
+        
         file_count = 0
         dir_count = 0
         total_size = 0
+        file_types = {} if include_file_types and detail_level == "full" else None
         
-        for root, dirs, files in os.walk(abs_path):
-            # Skip hidden directories
-            dirs[:] = [d for d in dirs if not d.startswith('.')]
-            
-            for file in files:
-                if not file.startswith('.'):
-                    file_count += 1
-                    try:
-                        file_path = os.path.join(root, file)
-                        total_size += os.path.getsize(file_path)
-                    except:
-                        pass  # Skip files we can't access
-            
-            dir_count += len(dirs)
+        # Calculate stats: scan the top level here and each subdirectory's tree in a thread pool;
+        # stat() releases the GIL, so subtrees on slow filesystems overlap
+        subdirs = []
+        for entry in _scan_tree(abs_path, recursive=False):
+            if entry.is_dir():
+                dir_count += 1
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            else:
+                file_count += 1
+                if file_types is not None:
+                    _add_file_type(file_types, entry.name)
+                try:
+                    total_size += entry.stat().st_size
+                except OSError:
+                    pass  # Skip files we can't access
+        
+        if len(subdirs) > 1:
+            with ThreadPoolExecutor(max_workers=min(32, len(subdirs))) as executor:
+                subtree_stats = list(executor.map(_scan_subtree, subdirs, [file_types is not None] * len(subdirs)))
+        else:
+            subtree_stats = [_scan_subtree(path, file_types is not None) for path in subdirs]
+        
+        for sub_files, sub_dirs, sub_size, sub_types in subtree_stats:
+            file_count += sub_files
+            dir_count += sub_dirs
+            total_size += sub_size
+            if file_types is not None:
+                for extension, count in sub_types.items():
+                    file_types[extension] = file_types.get(extension, 0) + count
+        
+        if detail_level == "size_only":
+            return True, {"total_size": total_size, "total_size_formatted": _format_file_size(total_size)}
         
         stats = {
             "file_count": file_count,
@@ -230,6 +333,8 @@ def get_directory_stats(relative_workspace_path: str, working_dir: str = ".") ->
             "total_size": total_size,
             "total_size_formatted": _format_file_size(total_size)
         }
+        if file_types is not None:
+            stats["file_types"] = file_types
         
         return True, stats
         
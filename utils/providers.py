@@ -0,0 +1,48 @@
+import os
+
+# Model used when none is given; override with the POCKETFLOW_LLM_MODEL environment variable
+DEFAULT_MODEL = os.environ.get("POCKETFLOW_LLM_MODEL", "claude-sonnet-4-20250514")
+
+# Sampling temperature for every LLM call (sync, async and batched); part of the call_llm cache key
+LLM_TEMPERATURE = 0.1
+
+# Requests per minute allowed per provider when running calls concurrently
+# (see utils.call_llm_async.gather_llm). Conservative defaults for low account
+# tiers; override with POCKETFLOW_<PROVIDER>_RPM, e.g. POCKETFLOW_OPENAI_RPM=5000
+PROVIDER_RPM = {
+    "anthropic": 50,
+    "openai": 500,
+    "gemini": 150,
+}
+
+# Limit used for providers not listed above
+DEFAULT_RPM = 60
+
+def provider_for(model: str) -> str:
+    """
+    Name of the provider LiteLLM routes a model to, e.g. "gemini/gemini-1.5-pro" -> "gemini"
+    """
+    if "/" in model:
+        return model.split("/", 1)[0]
+    if model.startswith("claude"):
+        return "anthropic"
+    if model.startswith(("gpt-", "o1", "o3", "o4")):
+        return "openai"
+    if model.startswith("gemini"):
+        return "gemini"
+    return "unknown"
+
+def rpm_for(model: str) -> int:
+    """
+    Requests-per-minute limit for the provider serving model
+    """
+    provider = provider_for(model)
+    override = os.environ.get(f"POCKETFLOW_{provider.upper()}_RPM")
+    if override and override.isdigit():
+        return int(override)
+    return PROVIDER_RPM.get(provider, DEFAULT_RPM)
+
+if __name__ == "__main__":
+    # Test the functions
+    for model in [DEFAULT_MODEL, "gpt-4o", "gemini/gemini-2.0-flash-exp"]:
+        print(f"{model}: {provider_for(model)}, {rpm_for(model)} rpm")
@@ -1,38 +1,45 @@
 import os
+import stat
 import logging
-from typing import Tuple
+from typing import Tuple, Union
+from utils.working_dir import WorkingDir, OutsideWorkingDirError, safe_join
 
-def read_file(target_file: str, working_dir: str = ".") -> Tuple[bool, str]:
+def read_file(target_file: str, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, str]:
     """
     Reads content from specified files
     
     Args:
         target_file: Path to the file (relative to working_dir)
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, file_content_or_error_message)
     """
     try:
-        # Construct absolute path
-        abs_path = os.path.abspath(os.path.join(working_dir, target_file))
-        
-        # Security check: ensure the path is within working_dir
-        abs_working_dir = os.path.abspath(working_dir)
-        if not abs_path.startswith(abs_working_dir):
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, target_file)
+        except OutsideWorkingDirError:
             return False, f"Error: Path {target_file} is outside working directory"
         
-        # Check if file exists
-        if not os.path.exists(abs_path):
+        # Open first and check the open file, instead of separate exists/isfile calls;
+        # O_NONBLOCK keeps a FIFO from blocking before it is rejected below
+        try:
+            fd = os.open(abs_path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0))
+        except (FileNotFoundError, NotADirectoryError):
             return False, f"Error: File {target_file} does not exist"
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                return False, f"Error: {target_file} is not a file"
+            data = _read_fd(fd, st.st_size)
+        finally:
+            os.close(fd)
         
-        # Check if it's actually a file
-        if not os.path.isfile(abs_path):
-            return False, f"Error: {target_file} is not a file"
-        
-        # Read the file
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Decode with universal newlines, as reading in text mode does
+        content = data.decode('utf-8')
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
         
         logging.info(f"Successfully read file: {target_file}")
         return True, content
@@ -50,22 +57,38 @@ def read_file(target_file: str, working_dir: str = ".") -> Tuple[bool, str]:
         logging.error(error_msg)
         return False, error_msg
 
-def get_file_info(target_file: str, working_dir: str = ".") -> Tuple[bool, dict]:
+def _read_fd(fd: int, size: int) -> bytes:
+    """
+    Read an open file to the end; when size (from fstat) is right this is a single read call
+    """
+    data = os.read(fd, size) if size else b""
+    if size and len(data) == size:
+        return data
+    
+    # Short read or a size of 0 (e.g. files in /proc): read until EOF
+    chunks = [data]
+    while True:
+        chunk = os.read(fd, 1 << 16)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+def get_file_info(target_file: str, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, dict]:
     """
     Gets file information (size, modification time, etc.)
     
     Args:
         target_file: Path to the file (relative to working_dir)
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, file_info_dict_or_error_message)
     """
     try:
-        abs_path = os.path.abspath(os.path.join(working_dir, target_file))
-        abs_working_dir = os.path.abspath(working_dir)
-        
-        if not abs_path.startswith(abs_working_dir):
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, target_file)
+        except OutsideWorkingDirError:
             return False, {"error": f"Path {target_file} is outside working directory"}
         
         if not os.path.exists(abs_path):
@@ -1,82 +1,238 @@
 import os
+import mmap
+import array
+import shutil
 import logging
-from typing import Tuple
+import tempfile
+from typing import Tuple, List, Dict, Any, Union, Optional
+from utils.working_dir import WorkingDir, OutsideWorkingDirError, safe_join
 
-def replace_file(target_file: str, start_line: int, end_line: int, new_content: str, working_dir: str = ".") -> Tuple[bool, str]:
+def replace_file(target_file: str, start_line: int, end_line: int, new_content: str, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, str]:
     """
     Replaces content in a file based on line numbers
     
+    A single-edit replace_file_batch: same-length replacements are patched in
+    place, others are written to a temp file that atomically replaces the original.
+    
     Args:
         target_file: Path to the file (relative to working_dir)
         start_line: First line to replace (1-indexed)
         end_line: Last line to replace (1-indexed, inclusive)
         new_content: New content to insert
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, result_message)
     """
-    try:
-        # Construct absolute path
-        abs_path = os.path.abspath(os.path.join(working_dir, target_file))
+    edit = {"start_line": start_line, "end_line": end_line, "replacement": new_content}
+    _, results = replace_file_batch(target_file, [edit], working_dir)
+    return results[0]
+
+def replace_file_batch(target_file: str, edits: List[Dict[str, Any]], working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, List[Tuple[bool, str]]]:
+    """
+    Applies several line-range replacements to one file with a single read and write
+    
+    Line numbers in every edit refer to the original file. The file is
+    spliced as bytes at line offsets, so untouched content is copied once
+    and keeps its original line endings. If every replacement has the same
+    byte length as the lines it replaces, they are patched in place;
+    otherwise the result is written to a temp file that atomically replaces
+    the original. Edits with invalid or overlapping ranges are reported as
+    failed and skipped; the rest are still applied.
+    
+    Args:
+        target_file: Path to the file (relative to working_dir)
+        edits: List of dicts with start_line, end_line (1-indexed, inclusive) and replacement
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
-        # Security check: ensure the path is within working_dir
-        abs_working_dir = os.path.abspath(working_dir)
-        if not abs_path.startswith(abs_working_dir):
-            return False, f"Error: Path {target_file} is outside working directory"
+    Returns:
+        Tuple of (success_status, per_edit_results) where per_edit_results holds
+        a (success, message) tuple for each edit in the order given. If the
+        file itself cannot be processed, per_edit_results is a single error tuple.
+    """
+    try:
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, target_file)
+        except OutsideWorkingDirError:
+            return False, [(False, f"Error: Path {target_file} is outside working directory")]
         
-        # Check if file exists
         if not os.path.exists(abs_path):
-            return False, f"Error: File {target_file} does not exist"
+            return False, [(False, f"Error: File {target_file} does not exist")]
         
-        # Check if it's actually a file
         if not os.path.isfile(abs_path):
-            return False, f"Error: {target_file} is not a file"
+            return False, [(False, f"Error: {target_file} is not a file")]
         
-        # Read the current file content
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        spans = []
+        tmp_path = None
         
-        # Validate line numbers
-        total_lines = len(lines)
-        if start_line < 1 or start_line > total_lines:
-            return False, f"Error: start_line {start_line} is out of range (1-{total_lines})"
+        # Map the file once and index its line starts; untouched lines are never split out
+        with open(abs_path, 'rb') as f:
+            # mmap cannot map an empty file, which has no lines to replace anyway
+            size = os.fstat(f.fileno()).st_size
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+            try:
+                # Validate against a C-level line count first; line offsets are
+                # only indexed when at least one edit is valid
+                total_lines = _count_lines(data)
+                results = [None] * len(edits)
+                valid = []
+                lowest_start = total_lines + 1
+                
+                # Validate from the highest start_line down; ranges must not overlap
+                order = sorted(range(len(edits)), key=lambda i: edits[i]["start_line"], reverse=True)
+                for i in order:
+                    start_line = edits[i]["start_line"]
+                    end_line = edits[i]["end_line"]
+                    new_content = edits[i]["replacement"]
+                    
+                    if start_line < 1 or start_line > total_lines:
+                        results[i] = (False, f"Error: start_line {start_line} is out of range (1-{total_lines})")
+                        continue
+                    if end_line < 1 or end_line > total_lines:
+                        results[i] = (False, f"Error: end_line {end_line} is out of range (1-{total_lines})")
+                        continue
+                    if start_line > end_line:
+                        results[i] = (False, f"Error: start_line {start_line} cannot be greater than end_line {end_line}")
+                        continue
+                    if end_line >= lowest_start:
+                        results[i] = (False, f"Error: lines {start_line}-{end_line} overlap another edit")
+                        continue
+                    
+                    # Prepare new content - ensure it ends with newline if not empty
+                    if new_content and not new_content.endswith('\n'):
+                        new_content += '\n'
+                    
+                    valid.append((start_line, end_line, new_content.encode('utf-8')))
+                    lowest_start = start_line
+                    results[i] = (True, f"Successfully replaced lines {start_line}-{end_line} in {target_file}")
+                
+                # Write back to file once, if any edit is valid; a length-changing
+                # edit needs the new content copied to a temp file while data is mapped
+                if valid:
+                    line_starts = _line_starts(data)
+                    spans = [(line_starts[start_line - 1], line_starts[end_line], replacement)
+                             for start_line, end_line, replacement in valid]
+                    if not _same_lengths(spans):
+                        tmp_path = _copy_with_spans(abs_path, data, spans)
+            finally:
+                if size:
+                    data.close()
         
-        if end_line < 1 or end_line > total_lines:
-            return False, f"Error: end_line {end_line} is out of range (1-{total_lines})"
+        # The original is closed and unmapped by now, which Windows requires before replacing it
+        if tmp_path is not None:
+            _replace_with(tmp_path, abs_path)
+        elif spans:
+            _patch_in_place(abs_path, spans)
         
-        if start_line > end_line:
-            return False, f"Error: start_line {start_line} cannot be greater than end_line {end_line}"
-        
-        # Prepare new content - ensure it ends with newline if not empty
-        if new_content and not new_content.endswith('\n'):
-            new_content += '\n'
-        
-        # Convert to 0-indexed for list operations
-        start_idx = start_line - 1
-        end_idx = end_line  # end_line is inclusive, so we don't subtract 1
-        
-        # Create new file content
-        new_lines = lines[:start_idx] + [new_content] + lines[end_idx:]
-        
-        # Write back to file
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
-        
-        success_msg = f"Successfully replaced lines {start_line}-{end_line} in {target_file}"
-        logging.info(success_msg)
-        return True, success_msg
+        applied = sum(1 for ok, _ in results if ok)
+        logging.info(f"Applied {applied}/{len(edits)} edits to {target_file}")
+        return all(ok for ok, _ in results), results
         
     except PermissionError:
         error_msg = f"Error: Permission denied writing to {target_file}"
         logging.error(error_msg)
-        return False, error_msg
+        return False, [(False, error_msg)]
     except Exception as e:
         error_msg = f"Error replacing content in {target_file}: {str(e)}"
         logging.error(error_msg)
-        return False, error_msg
+        return False, [(False, error_msg)]
 
-def insert_file(target_file: str, content: str, line_number: int = None, working_dir: str = ".") -> Tuple[bool, str]:
+def _same_lengths(spans: List[Tuple[int, int, bytes]]) -> bool:
+    """Whether every replacement in spans is as long as the byte range it replaces"""
+    return all(len(replacement) == end_off - start_off for start_off, end_off, replacement in spans)
+
+def _patch_in_place(abs_path: str, spans: List[Tuple[int, int, bytes]]):
+    """
+    Write same-length replacements over their byte ranges in abs_path;
+    the rest of the file is untouched
+    """
+    fd = os.open(abs_path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+    try:
+        for start_off, _, replacement in spans:
+            if hasattr(os, "pwrite"):
+                os.pwrite(fd, replacement, start_off)
+            else:  # Windows has no pwrite
+                os.lseek(fd, start_off, os.SEEK_SET)
+                os.write(fd, replacement)
+    finally:
+        os.close(fd)
+
+def _copy_with_spans(abs_path: str, data: Union[bytes, mmap.mmap], spans: List[Tuple[int, int, bytes]]) -> str:
+    """
+    Copy data (the current content of abs_path) with the replacements in spans
+    ((start_off, end_off, replacement), highest offset first) applied into a temp
+    file next to abs_path, for _replace_with to swap in
+
+    Returns:
+        The temp file's path
+    """
+    tmp = tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(abs_path), delete=False)
+    try:
+        with tmp, memoryview(data) as view:
+            cursor = 0
+            for start_off, end_off, replacement in reversed(spans):
+                tmp.write(view[cursor:start_off])
+                tmp.write(replacement)
+                cursor = end_off
+            tmp.write(view[cursor:])
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return tmp.name
+
+def _replace_with(tmp_path: str, abs_path: str):
+    """Atomically replace abs_path with tmp_path, keeping abs_path's permissions"""
+    try:
+        shutil.copymode(abs_path, tmp_path)
+        os.replace(tmp_path, abs_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _count_lines(data: Union[bytes, mmap.mmap], chunk_size: int = 1 << 20) -> int:
+    """
+    Number of lines in data as readlines() would count them, using bytes.count
+    on fixed-size slices (mmap has no count method) so no per-line objects are created
+    """
+    total_lines = 0
+    for offset in range(0, len(data), chunk_size):
+        total_lines += data[offset:offset + chunk_size].count(b"\n")
+    if data[-1:] not in (b"", b"\n"):
+        total_lines += 1
+    return total_lines
+
+def _line_starts(data: Union[bytes, mmap.mmap]) -> "array.array[int]":
+    """
+    Byte offset where each line starts, plus a final entry for the end of the data
+    (a trailing newline does not start another line, matching readlines()).
+    Offsets are kept in a compact array of 64-bit ints rather than a list.
+    """
+    starts = array.array('q', [0])
+    pos = data.find(b"\n")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = data.find(b"\n", pos + 1)
+    if starts[-1] != len(data):
+        starts.append(len(data))
+    return starts
+
+def _line_offset(data: Union[bytes, mmap.mmap], line_number: int) -> Optional[int]:
+    """
+    Byte offset where line line_number (1-indexed) starts, scanning only up to it;
+    one past the last line is the end of the data. None if out of range.
+    """
+    if line_number < 1:
+        return None
+    pos = 0
+    for _ in range(line_number - 1):
+        if pos >= len(data):
+            return None
+        newline = data.find(b"\n", pos)
+        pos = len(data) if newline == -1 else newline + 1
+    return pos
+
+def insert_file(target_file: str, content: str, line_number: int = None, working_dir: Union[str, WorkingDir] = ".") -> Tuple[bool, str]:
     """
     Writes or inserts content to a target file
     
@@ -84,49 +240,56 @@ def insert_file(target_file: str, content: str, line_number: int = None, working
         target_file: Path to the file (relative to working_dir)
         content: Content to insert
         line_number: Line number to insert at (1-indexed). If None, append to end
-        working_dir: Base directory for relative paths
+        working_dir: Base directory for relative paths (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, result_message)
     """
     try:
-        abs_path = os.path.abspath(os.path.join(working_dir, target_file))
-        abs_working_dir = os.path.abspath(working_dir)
-        
-        if not abs_path.startswith(abs_working_dir):
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, target_file)
+        except OutsideWorkingDirError:
             return False, f"Error: Path {target_file} is outside working directory"
         
         # Ensure content ends with newline
         if content and not content.endswith('\n'):
             content += '\n'
         
+        content_bytes = content.encode('utf-8')
+        
         # If file doesn't exist, create it
         if not os.path.exists(abs_path):
-            with open(abs_path, 'w', encoding='utf-8') as f:
-                f.write(content)
+            with open(abs_path, 'wb') as f:
+                f.write(content_bytes)
             return True, f"Created new file {target_file} with content"
         
-        # Read existing content
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
         # Insert content
         if line_number is None:
-            # Append to end
-            lines.append(content)
+            # Append to end without reading the existing content
+            with open(abs_path, 'ab') as f:
+                f.write(content_bytes)
             action = "appended to end of"
         else:
-            # Insert at specific line
-            if line_number < 1 or line_number > len(lines) + 1:
-                return False, f"Error: line_number {line_number} is out of range (1-{len(lines) + 1})"
-            
-            lines.insert(line_number - 1, content)
+            # Insert at specific line: only the bytes after it are rewritten, shifted in place
+            with open(abs_path, 'r+b') as f:
+                size = os.fstat(f.fileno()).st_size
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+                try:
+                    offset = _line_offset(mm, line_number)
+                    if offset is None:
+                        total_lines = len(_line_starts(mm)) - 1
+                        return False, f"Error: line_number {line_number} is out of range (1-{total_lines + 1})"
+                    tail = mm[offset:]
+                finally:
+                    if size:
+                        mm.close()
+                
+                f.seek(offset)
+                f.write(content_bytes)
+                f.write(tail)
             action = f"inserted at line {line_number} of"
         
-        # Write back to file
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
-        
         success_msg = f"Successfully {action} {target_file}"
         logging.info(success_msg)
         return True, success_msg
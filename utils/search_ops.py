@@ -1,15 +1,93 @@
 import os
 import re
+import sys
+import json
+import mmap
+import base64
+import fnmatch
+import shutil
 import logging
-from typing import List, Dict, Tuple, Optional
-import glob
+import sqlite3
+import functools
+import time
+import threading
+import subprocess
+from itertools import islice
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, Iterator, Union, NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+from utils.working_dir import WorkingDir, OutsideWorkingDirError, safe_join
+
+# grep_search returns at most this many matches
+_MAX_MATCHES = 50
+
+# Files with a NUL byte in this many leading bytes are treated as binary and skipped
+_BINARY_SNIFF_BYTES = 8192
+
+# Extensions searched when no include_pattern is given (files without an extension are searched too)
+_TEXT_EXTS = frozenset({'.txt', '.py', '.js', '.ts', '.html', '.css', '.md', '.json', '.xml', '.yaml', '.yml', '.sql', '.sh', '.bat', '.cfg', '.ini', '.log'})
+
+# Directories skipped, along with hidden ones, when no include_pattern is given
+_IGNORE_DIRS = frozenset({'node_modules', '__pycache__', 'venv', 'env'})
+
+# Recent file listings, keyed by (working_dir, include_pattern, exclude_pattern), with
+# the directories walked and their timestamps; reused while no directory has changed
+_FILE_LIST_CACHE_SIZE = 8
+# Listings are only cached once every walked directory's mtime is this much older than
+# the walk: within one timestamp tick (2 s on FAT) a change may leave the mtime as it was
+_MTIME_SLACK_NS = 2 * 10**9
+_file_list_cache = OrderedDict()
+_file_list_lock = threading.Lock()
+
+# Persistent copy of the listings shared across runs, used when POCKETFLOW_FILE_INDEX=1
+FILE_INDEX_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pocketflow", "files.sqlite"
+)
+
+_index_conn = None
+_index_lock = threading.Lock()
+
+# ripgrep, used for the content scan when installed
+_RG = shutil.which("rg")
+
+# Bytes that send a file down the line-by-line path: \r (text mode also splits
+# lines on it) and bytes where a str and a bytes pattern can match differently
+# (non-ASCII, and \x1c-\x1f which str \s matches but bytes \s does not)
+_SLOW_PATH_BYTES = re.compile(rb"[\r\x1c-\x1f\x80-\xff]")
+
+# For case-sensitive literal queries only line splitting can differ
+_CR_BYTES = re.compile(rb"\r")
+
+# Query syntax that can see past a line boundary when run over a whole buffer
+_LINE_SENSITIVE_SYNTAX = ("\\A", "\\Z", "(?=", "(?!", "(?<")
+
+# Characters that make a query more than a literal string
+_REGEX_SPECIAL = frozenset(".^$*+?{}[]\\|()")
+
+class _ByteQuery(NamedTuple):
+    """A query compiled for scanning whole files as bytes (see _compile_bytes)"""
+    pattern: re.Pattern
+    # Finds bytes that send a file down the line-by-line path instead
+    fallback_bytes: re.Pattern
+
+class Match(NamedTuple):
+    """
+    One regex match in a line; converted to a dict with _asdict() when
+    results are returned, so callers still get plain dicts
+    """
+    file_path: str
+    line_number: int
+    content: str
+    match_text: str
+    match_start: int
+    match_end: int
 
 def grep_search(
     query: str, 
     case_sensitive: bool = True, 
     include_pattern: Optional[str] = None, 
     exclude_pattern: Optional[str] = None,
-    working_dir: str = "."
+    working_dir: Union[str, WorkingDir] = "."
 ) -> Tuple[bool, List[Dict[str, any]]]:
     """
     Searches through files for specific patterns using ripgrep-like functionality
@@ -19,14 +97,14 @@ def grep_search(
         case_sensitive: Whether the search should be case sensitive
         include_pattern: Glob pattern for files to include (e.g. '*.py')
         exclude_pattern: Glob pattern for files to exclude
-        working_dir: Base directory for the search
+        working_dir: Base directory for the search (str or WorkingDir)
         
     Returns:
         Tuple of (success_status, list_of_matches)
         Each match is a dict with: {file_path, line_number, content, match_text}
     """
     try:
-        abs_working_dir = os.path.abspath(working_dir)
+        abs_working_dir = WorkingDir.of(working_dir).root
         
         # Security check
         if not os.path.exists(abs_working_dir):
@@ -35,9 +113,10 @@ def grep_search(
         # Compile regex pattern
         flags = 0 if case_sensitive else re.IGNORECASE
         try:
-            pattern = re.compile(query, flags)
+            pattern = _compile(query, flags)
         except re.error as e:
             return False, [{"error": f"Invalid regex pattern '{query}': {str(e)}"}]
+        byte_query = _compile_bytes(query, flags)
         
         matches = []
         
@@ -46,26 +125,60 @@ def grep_search(
             abs_working_dir, include_pattern, exclude_pattern
         )
         
-        # Search through files
-        for file_path in files_to_search[:100]:  # Limit to 100 files for performance
-            try:
-                rel_path = os.path.relpath(file_path, abs_working_dir)
-                file_matches = _search_file(file_path, pattern, rel_path)
-                matches.extend(file_matches)
-                
-                # Cap results at 50 matches as specified
-                if len(matches) >= 50:
-                    matches = matches[:50]
-                    break
+        files_to_search = files_to_search[:100]  # Limit to 100 files for performance
+        
+        # Let ripgrep find the matching lines when available; None means search in Python
+        rg_lines = _rg_search(files_to_search, query, case_sensitive) if _RG and files_to_search else None
+        
+        # File paths start with this prefix; slicing it off gives the relative path
+        prefix_len = len(os.path.join(abs_working_dir, ""))
+        
+        def search(file_path):
+            rel_path = file_path[prefix_len:]
+            if rg_lines is None:
+                return _search_file(file_path, pattern, rel_path, byte_query, max_matches=_MAX_MATCHES)
+            file_matches = []
+            lines = rg_lines.get(file_path, ())
+            if lines:
+                with open(file_path, 'rb') as f:
+                    if _is_binary(f):
+                        return file_matches
+            for line_num, line in lines:
+                _match_line(line, line_num, pattern, rel_path, file_matches, _MAX_MATCHES)
+            return file_matches
+        
+        # Search files concurrently when scanning in Python (file reads and the regex
+        # scan of an mmap release the GIL); results are still taken in file order
+        workers = min(32, (os.cpu_count() or 1) * 4, len(files_to_search))
+        with ThreadPoolExecutor(max_workers=workers or 1) as executor:
+            if rg_lines is None and workers > 1:
+                futures = [executor.submit(search, file_path) for file_path in files_to_search]
+            else:
+                futures = None
+            
+            # Search through files
+            for i, file_path in enumerate(files_to_search):
+                try:
+                    file_matches = futures[i].result() if futures else search(file_path)
+                    matches.extend(file_matches)
                     
-            except (UnicodeDecodeError, PermissionError):
-                # Skip files that can't be read
-                continue
-            except Exception as e:
-                logging.warning(f"Error searching file {file_path}: {str(e)}")
-                continue
+                    # Cap results at 50 matches as specified
+                    if len(matches) >= _MAX_MATCHES:
+                        matches = matches[:_MAX_MATCHES]
+                        break
+                        
+                except (UnicodeDecodeError, PermissionError):
+                    # Skip files that can't be read
+                    continue
+                except Exception as e:
+                    logging.warning(f"Error searching file {file_path}: {str(e)}")
+                    continue
+            
+            # Files not reached before the cap are not searched
+            for future in futures or ():
+                future.cancel()
         
-        return True, matches
+        return True, [m._asdict() for m in matches]
         
     except Exception as e:
         error_msg = f"Error during search: {str(e)}"
@@ -75,99 +188,401 @@ def grep_search(
 def _get_files_to_search(working_dir: str, include_pattern: Optional[str], exclude_pattern: Optional[str]) -> List[str]:
     """
     Get list of files to search based on include/exclude patterns
+    
+    The listing is cached: a later call with the same arguments only stats the
+    directories walked last time and reuses the list if none of them changed
+    (adding, removing or renaming an entry updates its directory's timestamps).
+    Listings that include a directory modified within _MTIME_SLACK_NS of the
+    walk are not cached, since a further change might not move its mtime.
+    With POCKETFLOW_FILE_INDEX=1 listings are also kept in a SQLite database at
+    FILE_INDEX_PATH, so later runs can skip the walk too.
+    """
+    key = (working_dir, include_pattern, exclude_pattern)
+    use_index = os.environ.get("POCKETFLOW_FILE_INDEX") == "1"
+    with _file_list_lock:
+        cached = _file_list_cache.get(key)
+    if cached is None and use_index:
+        cached = _load_listing(key)
+    
+    if cached is None or not _dirs_unchanged(cached[0]):
+        walk_start_ns = time.time_ns()
+        dir_stamps = []
+        files = _list_files(working_dir, include_pattern, exclude_pattern, dir_stamps)
+        if not _stamps_settled(dir_stamps, walk_start_ns):
+            with _file_list_lock:
+                _file_list_cache.pop(key, None)
+            return files
+        cached = (dir_stamps, files)
+        if use_index:
+            _store_listing(key, cached)
+    
+    with _file_list_lock:
+        _file_list_cache[key] = cached
+        _file_list_cache.move_to_end(key)
+        while len(_file_list_cache) > _FILE_LIST_CACHE_SIZE:
+            _file_list_cache.popitem(last=False)
+    return list(cached[1])
+
+def _load_listing(key: Tuple[str, Optional[str], Optional[str]]) -> Optional[Tuple[list, List[str]]]:
+    """
+    (dir_stamps, files) stored in the file index for key, or None
+    """
+    try:
+        with _index_lock:
+            row = _index_db().execute("SELECT dirs, files FROM listings WHERE key = ?", (json.dumps(key),)).fetchone()
+    except Exception as e:
+        logging.warning(f"File index unavailable, walking the tree: {e}")
+        return None
+    if row is None:
+        return None
+    return json.loads(row[0]), json.loads(row[1])
+
+def _store_listing(key: Tuple[str, Optional[str], Optional[str]], listing: Tuple[list, List[str]]):
+    """
+    Save (dir_stamps, files) for key in the file index
+    """
+    try:
+        with _index_lock:
+            conn = _index_db()
+            conn.execute(
+                "INSERT OR REPLACE INTO listings (key, dirs, files) VALUES (?, ?, ?)",
+                (json.dumps(key), json.dumps(listing[0]), json.dumps(listing[1]))
+            )
+            conn.commit()
+    except Exception as e:
+        logging.warning(f"Failed to store file listing in index: {e}")
+
+def _index_db() -> sqlite3.Connection:
+    """
+    Open the file index once per process (WAL mode, so concurrent runs can read while one writes)
+    """
+    global _index_conn
+    if _index_conn is None:
+        os.makedirs(os.path.dirname(FILE_INDEX_PATH), exist_ok=True)
+        conn = sqlite3.connect(FILE_INDEX_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS listings (key TEXT PRIMARY KEY, dirs TEXT NOT NULL, files TEXT NOT NULL)")
+        conn.commit()
+        _index_conn = conn
+    return _index_conn
+
+def _dirs_unchanged(dir_stamps: List[Tuple[str, int, int]]) -> bool:
+    """
+    Whether every directory still has the (mtime, ctime) recorded by _walk_files
+    """
+    for path, mtime_ns, ctime_ns in dir_stamps:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_mtime_ns != mtime_ns or st.st_ctime_ns != ctime_ns:
+            return False
+    return True
+
+def _stamps_settled(dir_stamps: List[Tuple[str, int, int]], walk_start_ns: int) -> bool:
+    """
+    Whether every directory in dir_stamps was last modified at least
+    _MTIME_SLACK_NS before walk_start_ns, so any later change moves its mtime
+    """
+    limit = walk_start_ns - _MTIME_SLACK_NS
+    return all(mtime_ns < limit for _, mtime_ns, _ in dir_stamps)
+
+def _list_files(working_dir: str, include_pattern: Optional[str], exclude_pattern: Optional[str], dir_stamps: List[Tuple[str, int, int]]) -> List[str]:
+    """
+    Walk working_dir for the files to search, recording the directories visited in dir_stamps
     """
     files = []
     
+    # Compile the glob patterns once instead of per file
+    include_match = _compile_glob(include_pattern) if include_pattern else None
+    exclude_match = _compile_glob(exclude_pattern) if exclude_pattern else None
+    
+    # Entry paths start with this prefix; slicing it off gives the relative path
+    prefix_len = len(os.path.join(working_dir, ""))
+    
     # Default to all files if no include pattern specified
-    if include_pattern:
+    if include_match:
         # Use glob to find files matching include pattern
-        for root, dirs, filenames in os.walk(working_dir):
-            for filename in filenames:
-                full_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(full_path, working_dir)
-                
-                # Check include pattern
-                if _matches_pattern(rel_path, include_pattern):
-                    files.append(full_path)
+        for entry in _walk_files(working_dir, prune=False, dir_stamps=dir_stamps):
+            # Check include pattern
+            if include_match(entry.path[prefix_len:]):
+                files.append(entry.path)
     else:
         # Get all text files (common text file extensions)
-        text_extensions = {'.txt', '.py', '.js', '.ts', '.html', '.css', '.md', '.json', '.xml', '.yaml', '.yml', '.sql', '.sh', '.bat', '.cfg', '.ini', '.log'}
-        
-        for root, dirs, filenames in os.walk(working_dir):
-            # Skip hidden directories and common ignore directories
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in {'node_modules', '__pycache__', 'venv', 'env'}]
-            
-            for filename in filenames:
-                if not filename.startswith('.'):  # Skip hidden files
-                    _, ext = os.path.splitext(filename)
-                    if ext.lower() in text_extensions or not ext:  # Include files without extension
-                        full_path = os.path.join(root, filename)
-                        files.append(full_path)
+        for entry in _walk_files(working_dir, prune=True, dir_stamps=dir_stamps):
+            filename = entry.name
+            if not filename.startswith('.'):  # Skip hidden files
+                # The extension starts at the last dot (the name has no leading dot, as for os.path.splitext)
+                dot = filename.rfind('.')
+                if dot <= 0 or filename[dot:].lower() in _TEXT_EXTS:  # Include files without extension
+                    files.append(entry.path)
     
     # Apply exclude pattern
-    if exclude_pattern:
-        files = [f for f in files if not _matches_pattern(
-            os.path.relpath(f, working_dir), exclude_pattern
-        )]
+    if exclude_match:
+        files = [f for f in files if not exclude_match(f[prefix_len:])]
     
     return files
 
-def _matches_pattern(filepath: str, pattern: str) -> bool:
+def _walk_files(top: str, prune: bool, dir_stamps: Optional[List[Tuple[str, int, int]]] = None) -> Iterator[os.DirEntry]:
     """
-    Check if filepath matches glob pattern
+    Yield the files under top in os.walk order (a directory's files before its
+    subdirectories) using os.scandir, whose entries carry the file type from the
+    directory listing, so no per-entry stat is needed
+    
+    Like os.walk, symlinked directories are not descended into, anything that is
+    not a directory counts as a file and unreadable directories are skipped.
+    With prune, hidden and common ignore directories are not descended into.
+    If dir_stamps is given, (path, mtime_ns, ctime_ns) of each directory is
+    appended to it before the directory is listed; ctime also catches
+    permission changes, e.g. an unreadable directory becoming readable.
+    """
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        try:
+            if dir_stamps is not None:
+                st = os.stat(path)
+                dir_stamps.append((path, st.st_mtime_ns, st.st_ctime_ns))
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                yield entry
+            elif not entry.is_symlink():
+                # Skip hidden directories and common ignore directories
+                if prune and (entry.name.startswith('.') or entry.name in _IGNORE_DIRS):
+                    continue
+                subdirs.append(entry.path)
+        
+        # Reversed so the first subdirectory is walked next
+        stack.extend(reversed(subdirs))
+
+def _compile_glob(pattern: str):
+    """
+    Compile a glob pattern into a match function for relative file paths
+    (same matching as fnmatch.fnmatch on POSIX, where paths are case-sensitive)
+    """
+    return re.compile(fnmatch.translate(pattern)).match
+
+def _rg_search(files: List[str], query: str, case_sensitive: bool) -> Optional[Dict[str, List[Tuple[int, str]]]]:
+    """
+    Find the lines matching query in files using `rg --json`
+    
+    The lines are matched again with the Python pattern by the caller, so match
+    offsets are the same as the Python search and lines ripgrep's regex syntax
+    matches differently are dropped.
+    
+    Returns:
+        A dict mapping each file with matches to its (line_number, line) pairs
+        (lines that are not valid UTF-8 are decoded with replacement characters),
+        or None if ripgrep failed (e.g. a query it cannot parse or an unreadable file)
     """
     try:
-        # Convert glob pattern to regex
-        import fnmatch
-        return fnmatch.fnmatch(filepath, pattern)
-    except:
-        return False
+        proc = subprocess.run(
+            [_RG, "--json", "--no-config", "--text", "--no-ignore", "--max-count", str(_MAX_MATCHES),
+             "--ignore-case" if not case_sensitive else "--case-sensitive",
+             "-e", query, "--", *files],
+            capture_output=True, timeout=60
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning(f"ripgrep search failed, falling back to Python: {e}")
+        return None
+    
+    # 0: matches found, 1: no matches, anything else: error
+    if proc.returncode not in (0, 1):
+        return None
+    
+    lines = {}
+    for event in proc.stdout.splitlines():
+        event = json.loads(event)
+        if event["type"] != "match":
+            continue
+        data = event["data"]
+        if "text" not in data["path"]:
+            return None
+        if "text" in data["lines"]:
+            line = data["lines"]["text"]
+        else:
+            line = base64.b64decode(data["lines"]["bytes"]).decode('utf-8', errors='replace')
+        lines.setdefault(data["path"]["text"], []).append((data["line_number"], line.rstrip('\n\r')))
+    return lines
+
+@functools.lru_cache(maxsize=256)
+def _compile(query: str, flags: int) -> re.Pattern:
+    """
+    re.compile, memoized so repeated searches for the same query skip compilation
+    """
+    return re.compile(query, flags)
 
-def _search_file(file_path: str, pattern: re.Pattern, rel_path: str) -> List[Dict[str, any]]:
+@functools.lru_cache(maxsize=256)
+def _compile_bytes(query: str, flags: int) -> Optional[_ByteQuery]:
+    """
+    Bytes version of the query used to find candidate lines in a whole file at once,
+    or None when the query cannot be run that way (line-sensitive syntax, or a
+    non-ASCII query that is not a case-sensitive literal)
+    
+    A case-sensitive literal matches the same UTF-8 bytes as its text, so it can
+    scan any file without \r; other queries only scan plain ASCII files.
+    """
+    if any(token in query for token in _LINE_SENSITIVE_SYNTAX):
+        return None
+    try:
+        if not flags & re.IGNORECASE and '\ufffd' not in query and _REGEX_SPECIAL.isdisjoint(query):
+            return _ByteQuery(re.compile(re.escape(query.encode('utf-8')), re.MULTILINE), _CR_BYTES)
+        if not query.isascii():
+            return None
+        return _ByteQuery(re.compile(query.encode('ascii'), flags | re.MULTILINE), _SLOW_PATH_BYTES)
+    except (re.error, UnicodeEncodeError):
+        return None
+
+def _search_file(
+    file_path: str,
+    pattern: re.Pattern,
+    rel_path: str,
+    byte_query: Optional[_ByteQuery] = None,
+    max_matches: Optional[int] = None
+) -> List[Match]:
     """
     Search for pattern in a single file
+    
+    With a byte_query (see _compile_bytes), files it can scan are memory-mapped
+    and scanned in one pass; only lines containing a candidate match are decoded
+    and matched with pattern, so results are the same as the line-by-line path.
+    Bytes that are not valid UTF-8 are decoded as replacement characters.
+    Scanning stops once max_matches matches are found (no limit if None).
     """
     matches = []
+    limit = sys.maxsize if max_matches is None else max_matches
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line_matches = pattern.finditer(line.rstrip('\n\r'))
-                for match in line_matches:
-                    matches.append({
-                        "file_path": rel_path,
-                        "line_number": line_num,
-                        "content": line.rstrip('\n\r'),
-                        "match_text": match.group(),
-                        "match_start": match.start(),
-                        "match_end": match.end()
-                    })
-    except UnicodeDecodeError:
-        # Skip binary files
-        pass
+        with open(file_path, 'rb') as f:
+            # Skip binary files before running the regex over them
+            if _is_binary(f):
+                return matches
+            if byte_query is not None and os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if byte_query.fallback_bytes.search(mm) is None:
+                        _search_buffer(mm, pattern, byte_query.pattern, rel_path, matches, limit)
+                        return matches
+            data = f.read()
+        
+        # Decode the whole file once, with universal newlines as text mode would
+        text = data.decode('utf-8', errors='replace')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        
+        scan_pattern = _multiline(pattern)
+        if scan_pattern is not None:
+            _search_buffer(text, pattern, scan_pattern, rel_path, matches, limit)
+            return matches
+        
+        lines = text.split('\n')
+        if lines[-1] == '':
+            lines.pop()  # A trailing newline does not start another line
+        for line_num, line in enumerate(lines, 1):
+            _match_line(line, line_num, pattern, rel_path, matches, limit)
+            if len(matches) >= limit:
+                break
     except Exception as e:
         logging.warning(f"Error reading file {file_path}: {str(e)}")
     
     return matches
 
-def search_in_file(file_path: str, query: str, working_dir: str = ".") -> Tuple[bool, List[Dict[str, any]]]:
+def _is_binary(f) -> bool:
+    """
+    Whether a file opened in binary mode looks binary: a NUL byte in its
+    first 8 KB, the same check ripgrep and git grep use. Leaves f at the start.
+    """
+    head = f.read(_BINARY_SNIFF_BYTES)
+    f.seek(0)
+    return b"\0" in head
+
+@functools.lru_cache(maxsize=256)
+def _multiline(pattern: re.Pattern) -> Optional[re.Pattern]:
+    """
+    pattern with MULTILINE added, for finding candidate lines in a whole decoded file,
+    or None if it uses syntax that can see past a line boundary
+    """
+    if any(token in pattern.pattern for token in _LINE_SENSITIVE_SYNTAX):
+        return None
+    return _compile(pattern.pattern, pattern.flags | re.MULTILINE)
+
+def _search_buffer(
+    buf: Union[str, mmap.mmap],
+    pattern: re.Pattern,
+    scan_pattern: re.Pattern,
+    rel_path: str,
+    matches: List[Match],
+    limit: int
+):
+    """
+    Append the matches in a \n-separated buffer (text, or UTF-8 bytes decoded per line),
+    visiting only lines scan_pattern hits, until matches holds limit entries
+    """
+    is_text = isinstance(buf, str)
+    newline = "\n" if is_text else b"\n"
+    size = len(buf)
+    line_num = 1
+    counted = 0  # Newlines before this offset are already included in line_num
+    pos = 0
+    while pos < size and len(matches) < limit:
+        hit = scan_pattern.search(buf, pos)
+        if hit is None:
+            break
+        line_start = buf.rfind(newline, 0, hit.start()) + 1
+        if line_start == size:
+            break  # Past the trailing newline, which does not start another line
+        line_end = buf.find(newline, hit.start())
+        if line_end == -1:
+            line_end = size
+        
+        line_num += buf[counted:line_start].count(newline)
+        counted = line_start
+        line = buf[line_start:line_end]
+        if not is_text:
+            line = line.decode('utf-8', errors='replace')
+        _match_line(line, line_num, pattern, rel_path, matches, limit)
+        pos = line_end + 1
+
+def _match_line(line: str, line_num: int, pattern: re.Pattern, rel_path: str, matches: List[Match], limit: int = sys.maxsize):
+    """
+    Append a Match for every match of pattern in one line, until matches holds limit entries
+    """
+    for match in islice(pattern.finditer(line), max(limit - len(matches), 0)):
+        matches.append(Match(rel_path, line_num, line, match.group(), match.start(), match.end()))
+
+def search_in_file(
+    file_path: str,
+    query: str,
+    working_dir: Union[str, WorkingDir] = ".",
+    pattern: Optional[re.Pattern] = None
+) -> Tuple[bool, List[Dict[str, any]]]:
     """
     Search for a pattern in a specific file only
     
     Args:
         file_path: Path to the specific file to search
-        query: The regex pattern to search for
-        working_dir: Base directory for relative paths
+        query: The regex pattern to search for (case-insensitive)
+        working_dir: Base directory for relative paths (str or WorkingDir)
+        pattern: Optional compiled str pattern used instead of compiling query,
+            e.g. when searching many files for the same query
         
     Returns:
         Tuple of (success_status, list_of_matches)
     """
     try:
-        abs_path = os.path.abspath(os.path.join(working_dir, file_path))
-        abs_working_dir = os.path.abspath(working_dir)
-        
-        # Security check
-        if not abs_path.startswith(abs_working_dir):
+        # Construct absolute path, ensuring it is within working_dir
+        try:
+            abs_path = safe_join(working_dir, file_path)
+        except OutsideWorkingDirError:
             return False, [{"error": f"Path {file_path} is outside working directory"}]
         
         if not os.path.exists(abs_path):
@@ -177,13 +592,19 @@ def search_in_file(file_path: str, query: str, working_dir: str = ".") -> Tuple[
             return False, [{"error": f"{file_path} is not a file"}]
         
         # Compile pattern
-        try:
-            pattern = re.compile(query, re.IGNORECASE)
-        except re.error as e:
-            return False, [{"error": f"Invalid regex pattern '{query}': {str(e)}"}]
+        if pattern is None:
+            try:
+                pattern = _compile(query, re.IGNORECASE)
+            except re.error as e:
+                return False, [{"error": f"Invalid regex pattern '{query}': {str(e)}"}]
+        
+        # The whole-file bytes scan only knows how to mirror IGNORECASE
+        byte_query = None
+        if not pattern.flags & ~(re.UNICODE | re.IGNORECASE):
+            byte_query = _compile_bytes(pattern.pattern, pattern.flags & re.IGNORECASE)
         
-        matches = _search_file(abs_path, pattern, file_path)
-        return True, matches
+        matches = _search_file(abs_path, pattern, file_path, byte_query)
+        return True, [m._asdict() for m in matches]
         
     except Exception as e:
         error_msg = f"Error searching file {file_path}: {str(e)}"
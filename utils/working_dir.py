@@ -0,0 +1,67 @@
+import os
+from typing import Union
+
+class OutsideWorkingDirError(ValueError):
+    """Raised when a relative path resolves outside the working directory"""
+
+class WorkingDir:
+    """
+    A working directory whose absolute path is normalized once
+
+    Utilities that take a working_dir accept either a str or a WorkingDir;
+    passing the same WorkingDir to many calls skips re-normalizing the root.
+    It is also os.PathLike, so it can be used anywhere a path is expected.
+    """
+    __slots__ = ("root",)
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]):
+        self.root = os.path.abspath(os.fspath(path))
+
+    @classmethod
+    def of(cls, working_dir: Union[str, "WorkingDir"]) -> "WorkingDir":
+        """Return working_dir itself if it is already a WorkingDir, else wrap it"""
+        return working_dir if isinstance(working_dir, cls) else cls(working_dir)
+
+    def resolve(self, relative_path: str) -> str:
+        """
+        Absolute path of relative_path under the root
+
+        Raises:
+            OutsideWorkingDirError: if the path is not the root or inside it
+                (a sibling such as /tmp/foobar is outside /tmp/foo)
+        """
+        abs_path = os.path.abspath(os.path.join(self.root, relative_path))
+        try:
+            inside = os.path.commonpath([abs_path, self.root]) == self.root
+        except ValueError:  # e.g. different drives on Windows
+            inside = False
+        if not inside:
+            raise OutsideWorkingDirError(relative_path)
+        return abs_path
+
+    def __fspath__(self) -> str:
+        return self.root
+
+    def __str__(self) -> str:
+        return self.root
+
+    def __repr__(self) -> str:
+        return f"WorkingDir({self.root!r})"
+
+def safe_join(working_dir: Union[str, WorkingDir], relative_path: str) -> str:
+    """
+    Absolute path of relative_path under working_dir (str or WorkingDir)
+
+    Raises:
+        OutsideWorkingDirError: if the path escapes working_dir
+    """
+    return WorkingDir.of(working_dir).resolve(relative_path)
+
+if __name__ == "__main__":
+    # Test the class
+    wd = WorkingDir("/tmp/foo")
+    print(wd.resolve("src/app.py"))
+    try:
+        wd.resolve("../foobar/x.py")
+    except OutsideWorkingDirError as e:
+        print(f"Rejected: {e}")